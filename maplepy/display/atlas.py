@@ -0,0 +1,232 @@
+import logging
+import threading
+
+import pygame
+
+
+class AtlasPage():
+    """
+    One shared surface, filled with a shelf allocator.
+
+    Regions are placed left to right on horizontal shelves. The page starts
+    small and doubles up to max_size when it runs out of room, so sets with
+    few sprites stay cheap. Freed space is only reclaimed when the page is
+    emptied or its group is repacked.
+    """
+
+    def __init__(self, size, max_size):
+
+        self.size = size
+        self.max_size = max_size
+        self.surface = pygame.Surface((size, size), pygame.SRCALPHA)
+
+        # Shelves as [y, height, next x]
+        self.shelves = []
+
+        # Area of live regions, and of freed regions not reclaimed yet
+        self.count = 0
+        self.used = 0
+        self.holes = 0
+
+    def allocate(self, w, h):
+        """ Returns a free rect of the requested size, growing the page if needed """
+
+        rect = self.place(w, h)
+        while not rect and self.size < self.max_size:
+            self.grow()
+            rect = self.place(w, h)
+        return rect
+
+    def grow(self):
+        """ Doubles the page up to max_size, regions keep their position """
+        size = min(self.size * 2, self.max_size)
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        surface.blit(self.surface, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        self.surface = surface
+        self.size = size
+
+    def place(self, w, h):
+        """ Returns a free rect on the current surface, or None if full """
+
+        # Shortest shelf the region fits on
+        best = None
+        for shelf in self.shelves:
+            y, height, x = shelf
+            if h <= height and x + w <= self.size and (not best or height < best[1]):
+                best = shelf
+
+        # Open a new shelf rather than waste most of a tall one
+        top = self.shelves[-1][0] + self.shelves[-1][1] if self.shelves else 0
+        if (not best or best[1] > 2 * h) and top + h <= self.size and w <= self.size:
+            best = [top, h, 0]
+            self.shelves.append(best)
+
+        # Full
+        if not best:
+            return None
+
+        # Take space on the shelf
+        rect = pygame.Rect(best[2], best[0], w, h)
+        best[2] += w
+        self.count += 1
+        self.used += w * h
+        return rect
+
+    def free(self, rect):
+        """ Release a region, the page is reset once nothing is left """
+
+        self.count -= 1
+        self.used -= rect.width * rect.height
+        self.holes += rect.width * rect.height
+        self.surface.fill((0, 0, 0, 0), rect)
+        if not self.count:
+            self.shelves = []
+            self.used = 0
+            self.holes = 0
+
+    def copy(self, image, rect, area=None):
+        """ Copy pixels into a region without blending """
+        self.surface.blit(image, rect, area, special_flags=pygame.BLEND_RGBA_MAX)
+        return self.surface.subsurface(rect)
+
+
+class Atlas():
+    """
+    Packs small sprites of the same group, such as a tile or object set,
+    into large shared surfaces.
+
+    A packed sprite's image becomes a subsurface of an atlas page. Pages
+    start at page_size and grow up to size. Sprites larger than max_size
+    keep their own surface. Removing sprites leaves holes that defragment()
+    closes by repacking groups where freed space passes max_holes of the
+    packed area; canvases still holding the old subsurfaces keep the old
+    page alive until they are dropped.
+    """
+
+    def __init__(self, size=2048, max_size=512, max_holes=0.25, page_size=256):
+
+        # Settings
+        self.size = size
+        self.page_size = min(page_size, size)
+        self.max_size = min(max_size, size)
+        self.max_holes = max_holes
+
+        # Pages per group, packed sprites as key: (group, page, rect, sprite)
+        self.groups = {}
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def add(self, group, key, sprite):
+        """ Moves a sprite's image into its group's pages if it fits """
+
+        w, h = sprite.image.get_size()
+        if w > self.max_size or h > self.max_size or not w or not h:
+            return False
+
+        with self.lock:
+
+            # Replace an older copy
+            self.remove(key)
+
+            # Find room, adding a page when every page is full
+            pages = self.groups.setdefault(group, [])
+            for page in pages:
+                surface = page.surface
+                rect = page.allocate(w, h)
+
+                # Point sprites at the grown surface
+                if page.surface is not surface:
+                    self.relink(page)
+
+                if rect:
+                    break
+            else:
+                page = self.new_page()
+                pages.append(page)
+                rect = page.allocate(w, h)
+
+            # Reference the region
+            sprite.image = page.copy(sprite.image, rect)
+            self.entries[key] = (group, page, rect, sprite)
+
+        return True
+
+    def new_page(self):
+        return AtlasPage(self.page_size, self.size)
+
+    def relink(self, page):
+        """ Points the sprites of a page at its current surface """
+        for key, (group, entry_page, rect, sprite) in self.entries.items():
+            if entry_page is page:
+                sprite.image = page.surface.subsurface(rect)
+
+    def remove(self, key):
+        """ Frees the region of a sprite """
+
+        with self.lock:
+
+            entry = self.entries.pop(key, None)
+            if not entry:
+                return
+
+            # Free, dropping pages that are empty
+            group, page, rect, _ = entry
+            page.free(rect)
+            if not page.count:
+                pages = self.groups[group]
+                pages.remove(page)
+                if not pages:
+                    del self.groups[group]
+
+    def get_holes(self, group):
+        """ Returns the fraction of a group's packed area that was freed """
+        pages = self.groups.get(group, [])
+        holes = sum(page.holes for page in pages)
+        packed = holes + sum(page.used for page in pages)
+        return holes / packed if packed else 0.0
+
+    def defragment(self):
+        """ Repacks every group with too many holes, groups never freed from are left alone """
+
+        with self.lock:
+            for group in list(self.groups):
+                if self.get_holes(group) > self.max_holes:
+                    self.repack(group)
+
+    def repack(self, group):
+        """ Copies a group's sprites into new, tightly packed pages """
+
+        with self.lock:
+
+            # Tallest first packs shelves best
+            entries = [(key, entry) for key, entry in self.entries.items()
+                       if entry[0] == group]
+            entries.sort(key=lambda item: item[1][2].height, reverse=True)
+
+            # Fill new pages from the old ones
+            pages = []
+            for key, (_, old_page, old_rect, sprite) in entries:
+                rect = pages[-1].allocate(old_rect.width, old_rect.height) if pages else None
+                if not rect:
+                    pages.append(self.new_page())
+                    rect = pages[-1].allocate(old_rect.width, old_rect.height)
+                self.entries[key] = (group, pages[-1], rect, sprite)
+                pages[-1].copy(old_page.surface, rect, old_rect)
+
+            # Pages may have grown while filling
+            for page in pages:
+                self.relink(page)
+
+            # Swap
+            before = len(self.groups.get(group, []))
+            if pages:
+                self.groups[group] = pages
+            else:
+                self.groups.pop(group, None)
+            logging.info(f'Atlas {group}: {before} -> {len(pages)} pages')
+
+    def memory_usage(self):
+        """ Returns the size of every page in bytes """
+        with self.lock:
+            return sum(page.size * page.size * 4
+                       for pages in self.groups.values() for page in pages)
@@ -115,6 +115,9 @@ class LayeredSprites():
     def blit(self, surface, offset=None):
         """ Draw all sprites """
 
+        # Visible sprites
+        sequence = []
+
         # For all sprites
         for sprite in self.sprites:
             try:
@@ -131,9 +134,23 @@ class LayeredSprites():
 
                     rect = sprite.rect.move(-offset.x, -offset.y)
 
-                # Draw
-                surface.blit(sprite.image, rect)
+                # Queue, checking here so one bad sprite can not fail the batch
+                if not isinstance(sprite.image, pygame.Surface):
+                    raise TypeError(f'{sprite} has no image')
+                sequence.append((sprite.image, pygame.Rect(rect)))
 
             except:
                 logging.exception('Failed to blit layer')
                 continue
+
+        # Draw in one call
+        try:
+            surface.blits(sequence, doreturn=False)
+
+        # Fall back to drawing one by one, skipping what fails
+        except:
+            for image, rect in sequence:
+                try:
+                    surface.blit(image, rect)
+                except:
+                    logging.exception('Failed to blit layer')
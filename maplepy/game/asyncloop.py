@@ -0,0 +1,34 @@
+import asyncio
+
+import pygame
+
+
+async def pump_events(fps=60, handler=None):
+    """
+    Pump pygame events once per frame so the window stays responsive
+    while other coroutines wait on nx lookups.
+
+    Args:
+        fps (int): frames per second to pump at
+        handler (callable): called with each pygame event
+    """
+
+    while True:
+        for event in pygame.event.get():
+            if handler:
+                handler(event)
+        pygame.event.pump()
+        await asyncio.sleep(1 / fps)
+
+
+def run(main, fps=60, handler=None):
+    """ Run a coroutine to completion while pumping pygame events """
+
+    async def runner():
+        pump = asyncio.ensure_future(pump_events(fps, handler))
+        try:
+            return await main
+        finally:
+            pump.cancel()
+
+    return asyncio.run(runner())
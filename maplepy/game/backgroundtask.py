@@ -0,0 +1,38 @@
+import threading
+
+
+class BackgroundTask:
+    """
+    Runs one cancellable job at a time in a daemon thread.
+
+    Starting a job cancels the previous one. Jobs get the cancel event as
+    their last argument and should check it between steps, the step in
+    progress always finishes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.thread = None
+        self.cancelled = threading.Event()
+
+    def start(self, fn, *args):
+        """ Cancel the previous job, then run fn(*args, cancelled) """
+
+        self.cancel()
+        self.cancelled = threading.Event()
+
+        self.thread = threading.Thread(target=fn,
+                                       args=args + (self.cancelled,),
+                                       name=self.name,
+                                       daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """ Ask the running job to stop """
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        """ Wait for the running job to return """
+        thread = self.thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
@@ -6,6 +6,7 @@ import pygame
 from maplepy.config import Config
 from maplepy.display.console import Console
 from maplepy.display.displayloop import DisplayLoop
+from maplepy.nx.displayitemsnx import resource_manager
 from maplepy.nx.displaynx import DisplayNx
 from maplepy.xml.displayxml import DisplayXml
 
@@ -108,6 +109,8 @@ class Game():
                 thread = threading.Thread(target=fn)
                 thread.start()
                 self.threads.append(thread)
+            if cmd == 'stats':
+                resource_manager.log_stats()
         except:
             logging.exception('Command failed')
             pass
@@ -1,5 +1,6 @@
 import pygame
 from maplepy.config import Config
+from maplepy.sound.soundbank import sound_bank
 
 vec = pygame.math.Vector2
 
@@ -103,8 +104,8 @@ class Player (pygame.sprite.Sprite):
             self.sprite_stand.append(image)
 
         # Sounds
-        self.sound_attack = pygame.mixer.Sound(
-            './sandbox/data/sounds/attack.wav')
+        self.sound_attack = 'attack'
+        sound_bank.load(self.sound_attack, './sandbox/data/sounds/attack.wav')
 
         # Blit
         self.image = self.sprite_stand[0]
@@ -173,7 +174,7 @@ class Player (pygame.sprite.Sprite):
             return
         self.attacking = True
         self.frame_count = 0
-        self.sound_attack.play()
+        sound_bank.play(self.sound_attack)
 
     def place(self, x, y, fixed=False):
         if not fixed:
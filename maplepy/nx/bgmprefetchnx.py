@@ -0,0 +1,61 @@
+import logging
+
+from maplepy.game.backgroundtask import BackgroundTask
+
+
+class BgmPrefetchNx:
+    """
+    Decodes the bgm of maps reachable through portals in a background
+    thread, so walking through a portal starts its music right away.
+    A new start cancels the previous run.
+    """
+
+    # Portal target used for 'no map'
+    NO_MAP = 999999999
+
+    def __init__(self, map_nx, sound_nx, stream=False):
+        self.map_nx = map_nx
+        self.sound_nx = sound_nx
+        self.stream = stream
+        self.task = BackgroundTask('bgm-prefetch')
+
+    def get_targets(self, map_id):
+        """ Return the map ids the portals of map_id lead to """
+
+        targets = []
+        for portal in self.map_nx.get_portal(map_id) or []:
+            tm = portal.get('tm')
+            if not isinstance(tm, int) or tm == BgmPrefetchNx.NO_MAP:
+                continue
+            target = f'{tm:09d}'
+            if target != map_id and target not in targets:
+                targets.append(target)
+
+        return targets
+
+    def start(self, map_id):
+        """ Prefetch the bgm of every neighbor of map_id, cancels the previous run """
+        self.task.start(self.run, map_id)
+
+    def cancel(self):
+        """ Stop prefetching, the track being decoded still finishes """
+        self.task.cancel()
+
+    def run(self, map_id, cancelled):
+
+        try:
+            for target in self.get_targets(map_id):
+
+                # Player went somewhere else
+                if cancelled.is_set():
+                    return
+
+                # Get bgm of the neighbor
+                info = self.map_nx.get_info(target)
+                if not info or 'bgm' not in info:
+                    continue
+
+                self.sound_nx.prefetch(info['bgm'], stream=self.stream)
+
+        except:
+            logging.exception(f'Failed to prefetch bgm near {map_id}')
@@ -280,7 +280,7 @@ class LayeredSpritesNx(displayitems.LayeredSprites):
             return
 
         # Hard code some known portal stuff here
-        portal_game = {2: 'pv', 7: 'pv'}
+        portal_game = map_nx.PORTAL_GAME
 
         # Go through portal list and add
         for val in values:
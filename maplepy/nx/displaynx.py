@@ -6,10 +6,17 @@ import time
 import pygame
 
 import maplepy.display.display as display
-from maplepy.nx.displayitemsnx import BackgroundSpritesNx, LayeredSpritesNx
+from maplepy.config import Config
+from maplepy.display.atlas import Atlas
+from maplepy.nx.bgmprefetchnx import BgmPrefetchNx
+from maplepy.nx.displayitemsnx import (BackgroundSpritesNx, LayeredSpritesNx,
+                                       resource_manager)
+from maplepy.nx.manifestnx import ManifestNx
 from maplepy.nx.mapnx import MapNx
 from maplepy.nx.soundnx import SoundNx
 from maplepy.sound.bgm import Bgm
+from maplepy.sound.pcmcache import PcmCache
+from maplepy.sound.soundbank import sound_bank
 
 map_file_names = ['map.nx', 'map001.nx', 'map002.nx', 'map2.nx']
 sound_file_names = ['sound.nx', 'sound001.nx', 'sound2.nx']
@@ -27,16 +34,48 @@ class DisplayNx(display.Display):
         self.path = path
         self.bgm = Bgm()
         self.maps = None
+        self.map_id = None
 
         # Objects in the map
         self.map_nx = MapNx()
         for file in map_file_names:
             self.map_nx.open(f'{path}/{file}')
 
-        self.sound_nx = SoundNx()
+        # Build missing outlink tables once, they persist next to the files
+        self.map_nx.file.scan_outlinks()
+
+        # Decoded bgm cache
+        config = Config.instance()
+        cache = None
+        if config['bgm_cache_path']:
+            cache = PcmCache(config['bgm_cache_path'],
+                             config['bgm_cache_size'] or 512 * 1024 * 1024)
+
+        self.sound_nx = SoundNx(cache)
+        self.bgm_mode = config['bgm_mode'] or 'decode'
         for file in sound_file_names:
             self.sound_nx.open(f'{path}/{file}')
 
+        # Effects come from the same sound files
+        sound_bank.sound_nx = self.sound_nx
+
+        # Decode bgm of neighboring maps in the background
+        self.prefetch = BgmPrefetchNx(self.map_nx, self.sound_nx,
+                                      stream=self.bgm_mode == 'stream')
+
+        # Number of left maps whose resources stay loaded
+        self.keep_maps = config['resource_keep_maps'] or 0
+
+        # Pack tiles and objects into shared surfaces
+        if config['atlas_size']:
+            resource_manager.atlas = Atlas(config['atlas_size'])
+
+        # Resources used by previously loaded maps
+        self.manifests = None
+        if config['manifest_path']:
+            self.manifests = ManifestNx(config['manifest_path'], resource_manager,
+                                        config['manifest_warm_size'] or 0)
+
     def load_random_map(self):
 
         # Check if map nx is loaded
@@ -69,6 +108,11 @@ class DisplayNx(display.Display):
         if not self.map_nx.get_map_node(map_id):
             return
 
+        # Neighbors of the old map are no longer needed
+        self.prefetch.cancel()
+        if self.manifests:
+            self.manifests.cancel()
+
         # Unload all old data
         self.bgm.unload()
         self.view.topleft = (0, 0)
@@ -77,15 +121,40 @@ class DisplayNx(display.Display):
         self.layered_sprites.clear()
         self.overlayed_sprites = None
 
-        # Setup and load
+        # Close holes left by released maps
+        resource_manager.defragment()
+
+        # Decode everything the map draws up front
+        self.preload_resources(map_id)
+
+        # Setup and load, remembering what the map uses
+        resource_manager.record()
         self.setup_info(map_id)
         self.setup_background_sprites(map_id)
         self.setup_layered_sprites(map_id)
         self.setup_portal_sprites(map_id)
+        usage = resource_manager.stop_recording()
+        if self.manifests:
+            self.manifests.save(map_id, usage)
+
+        # Keep what this map uses, then let go of the previous map once
+        # warming for it has stopped adding resources
+        resource_manager.pin(map_id, usage)
+        if self.map_id and self.map_id != map_id:
+            if self.manifests:
+                self.manifests.wait()
+            resource_manager.release(self.map_id, self.keep_maps)
+        self.map_id = map_id
 
         # Play bgm
         self.bgm.play()
 
+        # Prepare bgm and resources of maps reachable from here
+        self.prefetch.start(map_id)
+        if self.manifests:
+            self.manifests.start(self.map_nx.file,
+                                 self.prefetch.get_targets(map_id))
+
     def setup_info(self, map_id):
 
         # Check if map nx is loaded
@@ -139,12 +208,42 @@ class DisplayNx(display.Display):
         # Bgm
         if 'bgm' in info:
             try:
-                buffer = self.sound_nx.get_sound(info['bgm'])
-                self.bgm.load(info['bgm'], buffer=buffer)
+
+                # Stream mp3 tracks through the music player
+                stream = None
+                if self.bgm_mode == 'stream':
+                    stream = self.sound_nx.get_stream(info['bgm'])
+
+                # Otherwise, or if the stream can not be played, decode to pcm
+                if not stream or not self.bgm.load(info['bgm'], stream=stream):
+                    buffer = self.sound_nx.get_sound(info['bgm'])
+                    self.bgm.load(info['bgm'], buffer=buffer)
                 self.bgm.volume(1.0)
             except:
                 pass
 
+    def preload_resources(self, map_id):
+
+        # Check if map nx is loaded
+        if not self.map_nx.file:
+            return
+
+        # Sprites still load one by one if this fails, only slower
+        try:
+
+            # Use the working set learned on a previous load
+            learned = self.manifests.load(map_id) if self.manifests else None
+            if learned:
+                manifest = [key for key, _ in learned]
+            else:
+                manifest = self.map_nx.get_manifest(map_id)
+
+            # Load the map's manifest in parallel
+            resource_manager.preload(self.map_nx.file, manifest)
+
+        except:
+            logging.exception(f'Failed to preload resources of {map_id}')
+
     def setup_background_sprites(self, map_id):
 
         # Check if map nx is loaded
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+
+from maplepy.game.backgroundtask import BackgroundTask
+
+
+class ManifestNx:
+    """
+    Working sets learned from previous map loads.
+
+    Each map id is stored as a compact json file holding the resource keys
+    the map used and their decoded sizes. A known map preloads exactly
+    those keys, and the sets of neighboring maps are warmed in a background
+    thread up to a byte budget. A new start cancels the previous run.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, path, resource_manager, warm_size=0):
+        self.path = path
+        self.resource_manager = resource_manager
+        self.warm_size = warm_size
+        self.task = BackgroundTask('manifest-warm')
+        os.makedirs(path, exist_ok=True)
+
+    def get_path(self, map_id):
+        return os.path.join(self.path, map_id + ManifestNx.SUFFIX)
+
+    def load(self, map_id):
+        """ Return the learned (key, size) pairs of a map, or None """
+
+        try:
+            with open(self.get_path(map_id)) as file:
+                entries = json.load(file)
+            return [(tuple(entry[:4]), entry[4]) for entry in entries]
+
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, IndexError, TypeError):
+            logging.exception(f'Unable to read manifest of {map_id}')
+            return None
+
+    def save(self, map_id, usage):
+        """ Store the keys a map used, usage maps key to decoded size """
+
+        if not usage:
+            return
+
+        path = self.get_path(map_id)
+        temp = path + '.tmp'
+        try:
+            entries = [list(key) + [size] for key, size in usage.items()]
+            with open(temp, 'w') as file:
+                json.dump(entries, file, separators=(',', ':'))
+            os.replace(temp, path)
+        except OSError:
+            logging.exception(f'Unable to write manifest of {map_id}')
+
+    def start(self, file, map_ids):
+        """ Warm the learned resources of map_ids in the background """
+        if self.warm_size:
+            self.task.start(self.run, file, map_ids)
+        else:
+            self.task.cancel()
+
+    def cancel(self):
+        """ Stop warming, the map being warmed still finishes """
+        self.task.cancel()
+
+    def wait(self):
+        """ Wait until warming has stopped """
+        self.task.wait()
+
+    def run(self, file, map_ids, cancelled):
+
+        budget = self.warm_size
+        try:
+            for map_id in map_ids:
+
+                # Player went somewhere else
+                if cancelled.is_set():
+                    return
+
+                # Only maps loaded before have a working set
+                entries = self.load(map_id)
+                if not entries:
+                    continue
+
+                # Stay within budget
+                size = sum(size for _, size in entries)
+                if size > budget:
+                    continue
+                budget -= size
+
+                self.resource_manager.preload(file, [key for key, _ in entries])
+
+        except:
+            logging.exception('Failed to warm neighboring maps')
@@ -7,8 +7,13 @@ from nx.nxfile import NXFileSet
 class MapNx:
     """ Helper class to get values from a map nx file. """
 
+    # Portal types drawn in game and their MapHelper sprite group
+    PORTAL_GAME = {2: 'pv', 7: 'pv'}
+
     def __init__(self):
-        self.file = NXFileSet()
+
+        # Drop nodes of maps that are no longer referenced
+        self.file = NXFileSet(node_cache='weak')
 
     def open(self, file):
         """ Load file from path """
@@ -241,3 +246,61 @@ class MapNx:
 
         # Return
         return portal
+
+    def get_frames(self, path, animated=True):
+        """ Return the number of frames below an animation node """
+        if not animated:
+            return 1
+        node = self.file.resolve(path)
+        return node.child_count if node else 0
+
+    def get_manifest(self, map_id):
+        """
+        Return every resource the map draws as a deduplicated list of
+        (category, folder, subtype, name) keys, in the form used by ResourceNx.
+        """
+
+        manifest = {}
+
+        # Backgrounds
+        for back in self.get_back(map_id) or []:
+            if 'bS' not in back:
+                continue
+            subtype = 'ani' if back.get('ani') else 'back'
+            no = back.get('no')
+            path = f'Back/{back["bS"]}.img/{subtype}/{no}'
+            for index in range(self.get_frames(path, back.get('ani'))):
+                name = f'{no}/{index}' if back.get('ani') else str(no)
+                manifest[('Back', back['bS'], subtype, name)] = None
+
+        # Tiles and objects
+        for i in range(0, 8):
+            layer = self.get_layer(map_id, i)
+            if not layer:
+                continue
+
+            # Tiles
+            tile_set = layer['info'].get('tS')
+            if tile_set:
+                for tile in layer['tile']:
+                    manifest[('Tile', tile_set, tile.get('u'), str(tile.get('no')))] = None
+
+            # Objects
+            for obj in layer['obj']:
+                l0, l1, l2 = obj.get('l0'), obj.get('l1'), obj.get('l2')
+                path = f'Obj/{obj.get("oS")}.img/{l0}/{l1}/{l2}'
+                for index in range(self.get_frames(path)):
+                    manifest[('Obj', obj.get('oS'), l0, f'{l1}/{l2}/{index}')] = None
+
+        # Portals
+        for portal in self.get_portal(map_id) or []:
+            group = MapNx.PORTAL_GAME.get(portal.get('pt'))
+            if not group:
+                continue
+            image = portal.get('image', 'default')
+            path = f'MapHelper.img/portal/game/{group}/{image}'
+            for index in range(self.get_frames(path)):
+                no = f'game/{group}/{image}/{index}'
+                manifest[(None, 'MapHelper', 'portal', no)] = None
+
+        return list(manifest)
@@ -1,88 +1,330 @@
 import logging
+import threading
+import time
+from collections import OrderedDict
 
 from maplepy.nx.spritenx import SpriteNx
 
 
+class Resource():
+    """ Properties and sprite of a single nx node """
+
+    __slots__ = ('data', 'sprite')
+
+    def __init__(self, data=None, sprite=None):
+        self.data = data
+        self.sprite = sprite
+
+    @property
+    def size(self):
+        """ Decoded size of the sprite in bytes """
+        return self.sprite.width * self.sprite.height * 4 if self.sprite else 0
+
+
 class ResourceNx():
-    """ Helper class to manage nx data. Load once, then store as cache """
+    """
+    Helper class to manage nx data. Load once, then store as cache
+
+    Properties and sprite of a node are loaded together and stored under the
+    node's full path, so each node is only resolved and decoded once no
+    matter how many instances use it. Missing nodes are cached as well.
+
+    Maps pin the resources they use. Once a map is released and falls out
+    of the tail of recently released maps, resources no other map pins are
+    dropped, so memory follows the current scene.
+    """
 
     def __init__(self):
 
-        self.data = {}
-        self.sprites = {}
+        self.resources = {}
+        self.lock = threading.RLock()
 
-    def get_data(self, file, category, folder, subtype, name):
-        """ Returns the node's values """
+        # Counters per category as [hits, misses, load seconds, preloaded]
+        self.counters = {}
 
-        # Create key
-        folder += '.img'
-        key = '/'.join([x for x in [category, folder, subtype, name] if x])
-        # key = f'{category}/{folder}.img/{subtype}/{name}'
+        # Keys used while recording as key: size
+        self.usage = None
 
-        # Check if data is already loaded
-        if key in self.data:
-            return self.data[key]
+        # Shared surfaces for tile and object sprites
+        self.atlas = None
 
-        # Check if nx is loaded yet
-        if not file:
-            logging.warning('Nx file is invalid')
-            return None
+        # Pinned keys per map, pin count per key, recently released maps
+        self.pinned = {}
+        self.references = {}
+        self.released = OrderedDict()
 
-        data = {}
+    @staticmethod
+    def get_key(category, folder, subtype, name):
+        """ Returns the full path of a node """
+        folder += '.img'
+        return '/'.join([x for x in [category, folder, subtype, name] if x])
 
-        # Load from nx
-        node = file.resolve(key)
-        if not node:
-            logging.warning(f'{key} not found')
-            return None
+    def count(self, category, hit, elapsed=0.0):
+        """ Update the counters of a category, hit is None for a preload """
+        with self.lock:
+            counter = self.counters.setdefault(category, [0, 0, 0.0, 0])
+            counter[3 if hit is None else 0 if hit else 1] += 1
+            counter[2] += elapsed
 
-        # Parse into dictionary
-        for child in node.get_children():
-            if hasattr(child, 'value'):
-                data[child.name] = child.value
+    def record(self):
+        """ Start recording the keys that are used """
+        self.usage = {}
 
-        # Store and return
-        self.data[name] = data
-        return data
+    def stop_recording(self):
+        """ Stop recording, returns the used keys and their sizes """
+        usage, self.usage = self.usage, None
+        return usage
 
-    def get_sprite(self, file, category, folder, subtype, name):
-        """ Returns the node's sprite """
+    def get_resource(self, file, category, folder, subtype, name):
+        """ Returns the node's resource, loading it on the first request """
 
         # Create key
-        folder += '.img'
-        key = '/'.join([x for x in [category, folder, subtype, name] if x])
-        # key = f'{category}/{folder}.img/{subtype}/{name}'
+        key = ResourceNx.get_key(category, folder, subtype, name)
 
-        # Check if sprite is already loaded
-        if key in self.sprites:
-            return self.sprites[key]
+        # Check if resource is already loaded
+        resource = self.resources.get(key)
+        if resource:
+            self.count(category or folder, True)
 
         # Check if nx is loaded yet
-        if not file:
+        elif not file:
             logging.warning('Nx file is invalid')
             return None
 
+        # Load and store
+        else:
+            start = time.perf_counter()
+            resource = self.store(key, self.load(file, key))
+            self.count(category or folder, False, time.perf_counter() - start)
+
+        # Remember what was used
+        usage = self.usage
+        if usage is not None and resource.data is not None:
+            usage[(category, folder, subtype, name)] = resource.size
+
+        return resource
+
+    def store(self, key, resource):
+        """ Caches a loaded resource, packing its sprite into the atlas """
+
+        with self.lock:
+
+            # Another thread may have loaded it first
+            stored = self.resources.setdefault(key, resource)
+            if stored is not resource:
+                return stored
+
+            # Tiles and objects share surfaces per tile or object set
+            category = key.split('/', 1)[0]
+            if self.atlas and resource.sprite and resource.sprite.image and category in ('Tile', 'Obj'):
+                self.atlas.add('/'.join(key.split('/')[:2]), key, resource.sprite)
+
+        return resource
+
+    def drop(self, key):
+        """ Removes a resource and frees its atlas region """
+        with self.lock:
+            self.resources.pop(key, None)
+            if self.atlas:
+                self.atlas.remove(key)
+
+    def defragment(self):
+        """ Repacks sparse atlas pages, call once no canvas uses old sprites """
+        if self.atlas:
+            self.atlas.defragment()
+
+    def load(self, file, key):
+        """ Resolve a node, then read its values and image """
+
         # Get node
         node = file.resolve(key)
         if not node:
             logging.warning(f'{key} not found')
-            return None
+            return Resource()
+
+        return self.load_node(key, node)
+
+    def load_node(self, key, node, pixels=None):
+        """ Read the values and image of a node, pixels may be decoded already """
+
+        resource = Resource()
+
+        # Parse into dictionary
+        resource.data = {child.name: child.value for child in node.get_children()}
 
         # Get image
-        image = node.get_image()
-        if not image:
+        image = node.get_image() if node.type == 5 else None
+        if image:
+            resource.sprite = self.load_sprite(image, pixels)
+        else:
             logging.warning(f'{key} is not a sprite')
-            return None
 
-        return self.add_sprite(key, image)
+        return resource
+
+    def preload(self, file, keys):
+        """
+        Load every resource in keys that is not cached yet.
+        Nodes are resolved first, then all images are decoded in parallel
+        and sprites are built as each one finishes.
+
+        Resources that fail are logged and skipped, they load again through
+        get_resource when first used.
+        """
+
+        start = time.perf_counter()
+
+        # Resolve missing resources
+        pending = {}
+        for category, folder, subtype, name in keys:
+            key = ResourceNx.get_key(category, folder, subtype, name)
+            if key in self.resources:
+                continue
+            try:
+                node = file.resolve(key)
+            except:
+                logging.exception(f'Unable to preload {key}')
+                continue
+            if node:
+                pending[node] = (key, category or folder)
+
+        # Nodes without an image only need their values
+        images = [node for node in pending if node.type == 5]
+        for node in pending:
+            if node.type != 5:
+                key, _ = pending[node]
+                try:
+                    self.store(key, self.load_node(key, node))
+                except:
+                    logging.exception(f'Unable to preload {key}')
+
+        # Decode in parallel
+        for node, pixels in file.decode_images(images):
+            key, category = pending[node]
+            if pixels is None:
+                logging.warning(f'Unable to preload {key}')
+                continue
+            try:
+                self.store(key, self.load_node(key, node, pixels))
+                self.count(category, None)
+            except:
+                logging.exception(f'Unable to preload {key}')
+
+        logging.info(f'Preloaded {len(pending)} resources in '
+                     f'{(time.perf_counter() - start) * 1000:.1f} ms')
+
+    def get_data(self, file, category, folder, subtype, name):
+        """ Returns the node's values """
+        resource = self.get_resource(file, category, folder, subtype, name)
+        return resource.data if resource else None
+
+    def get_sprite(self, file, category, folder, subtype, name):
+        """ Returns the node's sprite """
+        resource = self.get_resource(file, category, folder, subtype, name)
+        return resource.sprite if resource else None
+
+    def load_sprite(self, image, pixels=None):
+        """ Loads image data into a sprite object """
+        if pixels is None:
+            pixels = image.get_data()
+        sprite = SpriteNx()
+        sprite.load(image.width, image.height, pixels)
+        return sprite
 
     def add_sprite(self, key, image):
         """ Loads data into a sprite object, then stores it in the cache """
 
         # Load as nx sprite
-        sprite = SpriteNx()
-        sprite.load(image.width, image.height, image.get_data())
+        sprite = self.load_sprite(image)
 
         # Store and return
-        self.sprites[key] = sprite
+        with self.lock:
+            self.resources[key] = Resource(sprite=sprite)
         return sprite
+
+    def pin(self, map_id, keys):
+        """ Keep the resources of a map loaded until the map is released """
+
+        keys = {ResourceNx.get_key(*key) for key in keys}
+        with self.lock:
+
+            # Map is in use again
+            self.released.pop(map_id, None)
+
+            # Count new pins before dropping the old ones, shared keys stay
+            old = self.pinned.get(map_id, set())
+            self.pinned[map_id] = keys
+            for key in keys:
+                self.references[key] = self.references.get(key, 0) + 1
+            self.unreference(old)
+
+    def release(self, map_id, keep=0):
+        """
+        Release the resources of a map. The last keep released maps stay
+        pinned, older ones are unpinned and anything left unpinned is dropped.
+        """
+
+        with self.lock:
+
+            # Add to the tail of recently released maps
+            if map_id in self.pinned:
+                self.released[map_id] = None
+                self.released.move_to_end(map_id)
+
+            # Unpin the oldest
+            while len(self.released) > keep:
+                old_id, _ = self.released.popitem(last=False)
+                self.unreference(self.pinned.pop(old_id, set()))
+
+            # Drop resources no map pinned, such as warmed neighbors not visited
+            for key in [key for key in list(self.resources) if key not in self.references]:
+                self.drop(key)
+
+    def unreference(self, keys):
+        """ Decrease pin counts, dropping resources that reach zero """
+        for key in keys:
+            count = self.references.get(key, 0) - 1
+            if count > 0:
+                self.references[key] = count
+            else:
+                self.references.pop(key, None)
+                self.drop(key)
+
+    def memory_usage(self):
+        """ Returns the decoded size of every cached sprite in bytes """
+        return sum(resource.size for resource in list(self.resources.values()))
+
+    def get_stats(self):
+        """ Returns hit, miss and load time counters per category """
+
+        with self.lock:
+            counters = dict(self.counters)
+
+        stats = {}
+        for category, (hits, misses, elapsed, preloaded) in counters.items():
+            lookups = hits + misses
+            stats[category] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'load_ms': elapsed * 1000,
+                'load_ms_avg': elapsed * 1000 / misses if misses else 0.0,
+                'preloaded': preloaded,
+            }
+        return stats
+
+    def log_stats(self):
+        """ Writes the counters to the log """
+
+        logging.info(f'Resources: {len(self.resources)} cached, '
+                     f'{self.memory_usage() / 1048576:.1f} MB, '
+                     f'{len(self.pinned)} maps pinned')
+        if self.atlas:
+            logging.info(f'Atlas: {len(self.atlas.entries)} sprites, '
+                         f'{self.atlas.memory_usage() / 1048576:.1f} MB')
+        for category, stat in sorted(self.get_stats().items()):
+            logging.info(f'{category}: {stat["hits"]} hits, '
+                         f'{stat["misses"]} misses '
+                         f'({stat["hit_rate"]:.1%}), '
+                         f'{stat["load_ms"]:.1f} ms loading '
+                         f'({stat["load_ms_avg"]:.2f} ms avg), '
+                         f'{stat["preloaded"]} preloaded')
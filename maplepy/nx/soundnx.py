@@ -4,14 +4,21 @@ import os
 
 from pydub import AudioSegment
 
+from nx.nxcache import LRUCache
 from nx.nxfile import NXFileSet
+from nx.nxsound import NXSound
 
 
 class SoundNx:
     """ Helper class to get values from a sound nx file. """
 
-    def __init__(self):
+    # Default byte budget for decoded tracks kept in memory
+    MEMORY_CACHE_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, cache=None, memory_cache_size=MEMORY_CACHE_SIZE):
         self.file = NXFileSet()
+        self.cache = cache
+        self.decoded = LRUCache(memory_cache_size, sizeof=len)
 
     def open(self, file):
         """ Load file from path """
@@ -26,31 +33,60 @@ class SoundNx:
         except:
             logging.exception(f'Unable to open {file}')
 
-    def get_sound(self, path):
+    def get_node(self, path):
+        """ Resolve a sound path such as Bgm00/GoPicnic or Game/PortalEnter """
+        paths = path.split('/')
+        return self.file.resolve(f'{paths[0]}.img/' + '/'.join(paths[1:]))
+
+    def get_stream(self, path):
+        """
+        Get the encoded mp3 payload as a file-like object, for playback
+        through pygame.mixer.music without decoding it up front.
+        Returns None for other formats.
+        """
+
+        # Get sound node
+        sound_node = self.get_node(path)
+        if not sound_node:
+            return None
+
+        # Only mp3 payloads can be streamed as is
+        sound = sound_node.get_nxsound()
+        if sound.get_header().format != NXSound.MP3:
+            return None
+
+        return sound.open()
+
+    def get_sound(self, path, cache=True):
         """
         Get audio buffer from byte array
         Convert audio to wav stream pcm_s16le: PCM signed 16-bit little-endian
         Target sample rate is 44100hz
+
+        Callers with their own cache, such as the effect bank, pass
+        cache=False to skip the memory and disk caches meant for bgm.
         """
 
+        # Recently decoded
+        buffer = self.decoded.get(path) if cache else None
+        if buffer:
+            return buffer
+
         # Get sound node
-        paths = path.split('/')
-        sound_path = f'{paths[0]}.img/{paths[1]}'
-        sound_node = self.file.resolve(sound_path)
+        sound_node = self.get_node(path)
         if not sound_node:
             return None
 
-        # Get sound data
-        sound = sound_node.get_sound()
-        data = io.BytesIO(sound[82:])
+        # Check the decoded cache
+        sound = sound_node.get_nxsound()
+        key = self.cache.key(sound) if self.cache and cache else None
+        if key:
+            data = self.cache.get(key)
+            if data:
+                return self.decoded.put(path, data)
 
-        # header = sound[32:82]
-        # fmt = int.from_bytes(header[8:12], 'big')
-        # channels = int.from_bytes(header[22:24], 'little')
-        # sample_rate = int.from_bytes(header[24:28], 'little')
-        # byte_rate = int.from_bytes(header[28:32], 'little')
-        # block_align = int.from_bytes(header[32:34], 'little')
-        # bits_per_sample = int.from_bytes(header[34:36], 'little')
+        # Stream the encoded payload, no copies of the sound data
+        data = sound.open()
 
         # Convert to wav
         audio_bytes = io.BytesIO()
@@ -59,4 +95,21 @@ class SoundNx:
                      format='wav',
                      codec='pcm_s16le',
                      parameters=['-ar', '44100'])
-        return audio_bytes.getbuffer()
+
+        # Store
+        if key:
+            self.cache.put(key, audio_bytes.getbuffer())
+
+        if not cache:
+            return audio_bytes.getbuffer()
+        return self.decoded.put(path, audio_bytes.getbuffer())
+
+    def prefetch(self, path, stream=False):
+        """ Decode a track ahead of time, streamed tracks need no work """
+
+        if path in self.decoded:
+            return
+        if stream and self.get_stream(path):
+            return
+
+        self.get_sound(path)
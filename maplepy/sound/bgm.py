@@ -1,27 +1,39 @@
+import logging
 import os
 
 import pygame
 
 
 class Bgm:
-    """ Class to handle sounds from a file or from a buffer """
+    """
+    Class to handle sounds from a file, a buffer or a stream.
+
+    Files and streams play through pygame.mixer.music, which decodes as it
+    plays. Buffers are loaded into a pygame.mixer.Sound.
+    """
 
     def __init__(self):
         self.name = None
         self.file = None
+        self.stream = None
         self.sound = None
         self.channel = None
 
+    @property
+    def music(self):
+        return self.file or self.stream
+
     def unload(self):
         self.stop()
         self.__init__()
 
-    def load(self, name, file=None, buffer=None):
+    def load(self, name, file=None, buffer=None, stream=None, namehint='mp3'):
+        """ Load a track, returns False if it could not be loaded """
         try:
 
             # Check arguments
             if self.name == name:
-                return
+                return True
 
             # Stop current channel
             self.stop()
@@ -31,19 +43,27 @@ class Bgm:
                 pygame.mixer.music.load(file)
                 self.file = file
 
+            # Load from a file-like object, kept open while it plays.
+            # There is no file name to detect the format from, so hint it
+            if stream:
+                pygame.mixer.music.load(stream, namehint)
+                self.stream = stream
+
             # Load from buffer
             if buffer:
                 self.sound = pygame.mixer.Sound(buffer=buffer)
 
             # Update name
             self.name = name
+            return True
 
         except:
-            pass
+            logging.warning(f'Unable to load {name}')
+            return False
 
     def volume(self, val):
 
-        if self.file:
+        if self.music:
             pygame.mixer.music.set_volume(val)
 
         if self.sound:
@@ -51,19 +71,25 @@ class Bgm:
 
     def play(self):
 
-        if self.channel and self.channel.get_busy():
+        if self.music:
+            if not pygame.mixer.music.get_busy():
+                pygame.mixer.music.play(loops=-1, fade_ms=250)
             return
 
-        if self.file:
-            self.channel = pygame.mixer.music.play(loops=-1, fade_ms=250)
+        if self.channel and self.channel.get_busy():
+            return
 
         if self.sound:
             self.channel = self.sound.play(loops=-1, fade_ms=250)
 
     def pause(self):
+        if self.music:
+            pygame.mixer.music.pause()
         if self.channel:
             self.channel.pause()
 
     def stop(self):
+        if self.music:
+            pygame.mixer.music.stop()
         if self.channel:
             self.channel.stop()
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+
+class PcmCache:
+    """
+    On-disk cache of decoded audio.
+
+    Files are content-addressed by the identity of the nx sound they were
+    decoded from, and the least recently used files are removed once the
+    directory grows past max_size bytes.
+    """
+
+    SUFFIX = '.wav'
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, sound):
+        """ Key a nx sound by its file, the file's version and its location """
+        stat = os.stat(sound.nxfile.path)
+        identity = '/'.join(str(x) for x in [
+            os.path.basename(sound.nxfile.path), stat.st_size, stat.st_mtime_ns,
+            sound.offset, sound.length])
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """ Return cached data, or None """
+
+        path = os.path.join(self.path, key + PcmCache.SUFFIX)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+
+            # Mark as recently used
+            os.utime(path)
+            return data
+
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """ Store data, then evict old entries """
+
+        temp = None
+        try:
+            # Write to a temporary file, then swap
+            fd, temp = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp, os.path.join(self.path, key + PcmCache.SUFFIX))
+        except OSError:
+            logging.exception(f'Unable to cache {key}')
+
+            # Evict only sees cached files, do not leave the temporary one
+            if temp and os.path.exists(temp):
+                try:
+                    os.remove(temp)
+                except OSError:
+                    logging.warning(f'Unable to remove {temp}')
+            return
+
+        self.evict()
+
+    def evict(self):
+        """ Remove least recently used files until under max_size """
+
+        with self.lock:
+
+            # List cached files, oldest first
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(PcmCache.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            entries.sort()
+
+            # Remove
+            size = sum(entry[1] for entry in entries)
+            for _, file_size, path in entries:
+                if size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    size -= file_size
+                except OSError:
+                    logging.warning(f'Unable to remove {path}')
@@ -0,0 +1,142 @@
+import io
+import logging
+import threading
+import time
+
+import pygame
+
+from nx.nxcache import LRUCache
+
+
+class SoundBank:
+    """
+    Effect sounds decoded once and played through a pool of reserved
+    mixer channels.
+
+    When every channel is busy the voice that started first is stolen.
+    Each effect can be rate limited so bursts of the same sound do not
+    take over the pool.
+    """
+
+    # Default byte budget for decoded effects
+    CACHE_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, sound_nx=None, channels=8, cache_size=CACHE_SIZE, min_interval=30):
+        """
+        Args:
+            sound_nx (SoundNx): source for effects given by nx path
+            channels (int): number of mixer channels reserved for effects
+            cache_size (int): byte budget for decoded effects
+            min_interval (int): default minimum milliseconds between plays of one effect
+        """
+
+        self.sound_nx = sound_nx
+        self.channel_count = channels
+        self.min_interval = min_interval
+        self.sounds = LRUCache(cache_size, sizeof=self.sizeof)
+        self.lock = threading.Lock()
+
+        # Pool, created once the mixer is running
+        self.channels = []
+        self.started = []
+
+        # Last play time of each effect
+        self.played = {}
+
+        # Files of effects loaded from disk, so evicted ones can be reloaded
+        self.files = {}
+
+    @staticmethod
+    def sizeof(sound):
+        """ Estimate the bytes held by a decoded sound """
+        frequency, size, channels = pygame.mixer.get_init() or (44100, -16, 2)
+        return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+    def get_channels(self):
+        """ Reserve the channel pool on first use """
+
+        if not self.channels:
+            count = max(pygame.mixer.get_num_channels(), self.channel_count)
+            pygame.mixer.set_num_channels(count)
+            pygame.mixer.set_reserved(self.channel_count)
+            self.channels = [pygame.mixer.Channel(i) for i in range(self.channel_count)]
+            self.started = [0.0] * self.channel_count
+
+        return self.channels
+
+    def load(self, name, file=None):
+        """ Decode an effect from a file or, by default, from its nx path """
+
+        # Remember where the effect comes from
+        if file:
+            self.files[name] = file
+        else:
+            file = self.files.get(name)
+
+        # Check cache
+        sound = self.sounds.get(name)
+        if sound:
+            return sound
+
+        try:
+
+            # Load from file
+            if file:
+                sound = pygame.mixer.Sound(file)
+
+            # Load from nx
+            elif self.sound_nx:
+                buffer = self.sound_nx.get_sound(name, cache=False)
+                if buffer:
+                    sound = pygame.mixer.Sound(file=io.BytesIO(buffer))
+
+        except:
+            logging.exception(f'Unable to load sound {name}')
+            return None
+
+        # Store
+        if not sound:
+            logging.warning(f'{name} not found')
+            return None
+        return self.sounds.put(name, sound)
+
+    def play(self, name, volume=1.0, min_interval=None, file=None):
+        """ Play an effect, returns the channel or None if it was skipped """
+
+        # Rate limit
+        now = time.monotonic()
+        interval = self.min_interval if min_interval is None else min_interval
+        if (now - self.played.get(name, -interval)) * 1000 < interval:
+            return None
+
+        # Get sound
+        sound = self.load(name, file)
+        if not sound:
+            return None
+
+        with self.lock:
+
+            # Pick a free channel, or steal the oldest voice
+            channels = self.get_channels()
+            index = next((i for i, channel in enumerate(channels)
+                          if not channel.get_busy()), None)
+            if index is None:
+                index = self.started.index(min(self.started))
+
+            # Play
+            channel = channels[index]
+            channel.set_volume(volume)
+            channel.play(sound)
+            self.started[index] = now
+            self.played[name] = now
+
+        return channel
+
+    def stop(self):
+        """ Stop every effect """
+        for channel in self.channels:
+            channel.stop()
+
+
+# Shared effect bank
+sound_bank = SoundBank()
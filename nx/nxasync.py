@@ -0,0 +1,49 @@
+import asyncio
+import weakref
+
+from nx.nxfile import decode_image
+
+
+class AsyncNXFileSet:
+    """
+    asyncio front-end for an NXFileSet.
+
+    Lookups and lz4 decoding block, so they run on an executor (the file
+    set's worker pool by default). A semaphore bounds how many are in
+    flight, so callers can schedule thousands of lookups at once.
+    """
+
+    def __init__(self, fileset, executor=None, concurrency=16):
+        self.fileset = fileset
+        self.executor = executor
+        self.concurrency = concurrency
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    async def run(self, fn, *args):
+        """ Run a blocking call on the executor """
+
+        # Semaphores belong to a loop, keep one per running loop
+        loop = asyncio.get_running_loop()
+        semaphore = self.semaphores.get(loop)
+        if not semaphore:
+            semaphore = self.semaphores[loop] = asyncio.Semaphore(self.concurrency)
+
+        async with semaphore:
+            executor = self.executor or self.fileset.get_executor()
+            return await loop.run_in_executor(executor, fn, *args)
+
+    async def resolve(self, path):
+        """ Resolve a path """
+        return await self.run(self.fileset.resolve, path)
+
+    async def get_image_data(self, node):
+        """ Decode the pixels of an image node """
+        return await self.run(decode_image, node)
+
+    async def get_sound_data(self, node):
+        """ Read the data of a sound node """
+        return await self.run(node.get_sound)
+
+    async def gather_images(self, nodes):
+        """ Decode image nodes concurrently, results keep the input order """
+        return await asyncio.gather(*[self.get_image_data(node) for node in nodes])
@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache.
+
+    Entries are weighed with sizeof (1 per entry by default), and the
+    least recently used entries are evicted once the total weight goes
+    over capacity. A capacity of 0 disables the cache.
+    """
+
+    def __init__(self, capacity, sizeof=None):
+
+        # Settings
+        self.capacity = capacity
+        self.sizeof = sizeof or (lambda value: 1)
+
+        # Entries as key: (value, size)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """ Return the cached value and mark it as recently used """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """ Store a value, evicting the least recently used entries """
+
+        size = self.sizeof(value)
+        with self.lock:
+
+            # Replace the old entry
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+            # Values larger than the whole cache are not kept
+            if size > self.capacity:
+                return value
+
+            # Store
+            self.entries[key] = (value, size)
+            self.size += size
+
+            # Evict until under capacity
+            while self.size > self.capacity:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+        return value
+
+    def setdefault(self, key, value):
+        """ Return the cached value, storing value first if missing """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+
+        return self.put(key, value)
+
+    def pop(self, key, default=None):
+        """ Remove a value from the cache """
+
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return default
+            self.size -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        """ Remove every entry """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """ Return hit, miss and eviction counters """
+
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'size': self.size,
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
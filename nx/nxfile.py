@@ -1,48 +1,159 @@
+import concurrent.futures
 import logging
+import mmap
 import os
 import struct
+import sys
+import threading
+import weakref
 
+import numpy
+
+from nx.nxcache import LRUCache
+from nx.nximage import NXImage
+from nx.nxindex import NXIndex
 from nx.nxnode import NXNode
+from nx.nxoutlink import NXOutlinks
+
+
+def decode_image(node):
+    """ Decode the pixels of a single image node """
+    return node.get_image().get_data()
+
+
+def decode_images(executor, nodes):
+    """
+    Decode image nodes on a worker pool.
+    Yields (node, data) pairs in the order they finish.
+    lz4 releases the GIL, so decoding scales with the worker count.
+
+    A node that fails to decode is logged and yielded as (node, None), the
+    rest of the batch still decodes.
+    """
+
+    # Submit every node
+    futures = {executor.submit(decode_image, node): node for node in nodes}
+
+    # Hand out results as they complete
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            node = futures[future]
+            try:
+                data = future.result()
+            except Exception:
+                logging.exception(f'Unable to decode image node {node.index}')
+                data = None
+            yield node, data
+    finally:
+        for future in futures:
+            future.cancel()
 
 
 class NXFile():
     """ Read from the NX file format [PKG4] """
 
-    _MAGIC = 'PKG4'
+    _MAGIC = b'PKG4'
+    _HEADER = struct.Struct('<4sIQIQIQIQ')
+    _OFFSET = struct.Struct('<Q')
+    _LENGTH = struct.Struct('<H')
+
+    # Default byte budget for decoded image pixels
+    PIXEL_CACHE_SIZE = 256 * 1024 * 1024
+
+    # Default number of memoized paths
+    RESOLVE_CACHE_SIZE = 64 * 1024
+
+    # Default number of nodes kept by the lru node cache
+    NODE_CACHE_SIZE = 64 * 1024
 
-    def __init__(self, path, parent=None):
+    # Marks paths that are not cached yet, None is a cached miss
+    _MISSING = object()
+
+    def __init__(self, path, parent=None, use_mmap=True, workers=None,
+                 pixel_cache_size=PIXEL_CACHE_SIZE,
+                 resolve_cache_size=RESOLVE_CACHE_SIZE,
+                 bulk_strings=True, path_index=True,
+                 node_cache='unbounded', node_cache_size=NODE_CACHE_SIZE):
+        """
+        Node cache policies:
+            unbounded   keep every node that was read
+            lru         keep the node_cache_size most recently used nodes
+            weak        keep nodes only while something else references them
+        """
 
         # Update variables
         self.path = path
         self.parent = parent
+        self.workers = workers
+        self.executor = None
+
+        # Decoded pixels, shared with the rest of the set
+        self.pixels = parent.pixels if parent else LRUCache(
+            pixel_cache_size, sizeof=len)
+
+        # Memoized path lookups, including misses
+        self.resolved = LRUCache(resolve_cache_size)
 
         # Open file for reading
         self.file = open(path, 'rb')
+        self.lock = threading.Lock()
+
+        # Map the whole file, reads become slices of the mapping
+        self.map = None
+        self.view = None
+        if use_mmap:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
 
         # Check for nx pkg4 type
-        magic = self.file.read(4).decode('ascii')
-        if magic != NXFile._MAGIC:
+        header = self.read(0, NXFile._HEADER.size)
+        if len(header) < NXFile._HEADER.size or bytes(header[0:4]) != NXFile._MAGIC:
             raise Exception('Cannot read file. Invalid format')
 
         # Header info
-        self.node_count = int.from_bytes(self.file.read(4), 'little')
-        self.node_offset = int.from_bytes(self.file.read(8), 'little')
-        self.string_count = int.from_bytes(self.file.read(4), 'little')
-        self.string_offset = int.from_bytes(self.file.read(8), 'little')
-        self.image_count = int.from_bytes(self.file.read(4), 'little')
-        self.image_offset = int.from_bytes(self.file.read(8), 'little')
-        self.sound_count = int.from_bytes(self.file.read(4), 'little')
-        self.sound_offset = int.from_bytes(self.file.read(8), 'little')
+        (_,
+         self.node_count, self.node_offset,
+         self.string_count, self.string_offset,
+         self.image_count, self.image_offset,
+         self.sound_count, self.sound_offset) = NXFile._HEADER.unpack_from(header)
 
         # Print header
         self.dump_header()
 
+        # Decode the node table in one pass
+        self.table = numpy.frombuffer(
+            self.read(self.node_offset, self.node_count * NXNode.DTYPE.itemsize),
+            dtype=NXNode.DTYPE, count=self.node_count)
+        self.headers = self.table.view(NXNode.HEADER_DTYPE)
+
+        # Load the string offset table in one read
+        self.string_offsets = None
+        if bulk_strings:
+            self.string_offsets = numpy.frombuffer(
+                self.read(self.string_offset, self.string_count * 8),
+                dtype='<u8', count=self.string_count)
+
+        # Node cache
+        if node_cache == 'unbounded':
+            self.nodes = {}
+        elif node_cache == 'lru':
+            self.nodes = LRUCache(node_cache_size)
+        elif node_cache == 'weak':
+            self.nodes = weakref.WeakValueDictionary()
+        else:
+            raise ValueError(f'Unknown node cache policy {node_cache}')
+
         # Init data
-        self.nodes = [None] * self.node_count
         self.strings = {}
         self.images = {}
         self.sounds = {}
 
+        # Outlinked canvases, persisted next to the file
+        self.outlinks = NXOutlinks(self)
+
+        # Prebuilt path index, see nx.nxindex
+        self.index = NXIndex.open(self) if path_index else None
+
     def dump_header(self):
         """ Dump header data """
 
@@ -56,36 +167,270 @@ class NXFile():
         logging.info(f'sound_count: {self.sound_count}')
         logging.info(f'sound_offset: {self.sound_offset}')
 
+    def read(self, offset, size):
+        """
+        Read size bytes at offset without touching a shared file pointer.
+        Memory-mapped files return a zero-copy memoryview slice.
+        """
+
+        # Slice the mapping
+        if self.view is not None:
+            return self.view[offset:offset + size]
+
+        # Positional read, safe to call from several threads
+        if hasattr(os, 'pread'):
+            return os.pread(self.file.fileno(), size, offset)
+
+        # Platforms without pread have to serialize seek and read
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(size)
+
+    def unpack(self, fmt, offset):
+        """ Unpack a struct at offset """
+        if self.view is not None:
+            return fmt.unpack_from(self.view, offset)
+        return fmt.unpack(self.read(offset, fmt.size))
+
+    def read_offset(self, table, index):
+        """ Read a 64-bit offset from a string, image or sound offset table """
+        return self.unpack(NXFile._OFFSET, table + index * 8)[0]
+
+    def close(self):
+        """ Release the mapping and file handle """
+
+        # Keep outlinks found this session
+        self.outlinks.save()
+
+        # Stop decoding
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+        # Drop the views first, mmap refuses to close while it is exported
+        if self.index:
+            self.index.close()
+            self.index = None
+        self.table = None
+        self.headers = None
+        self.string_offsets = None
+        try:
+            if self.view is not None:
+                self.view.release()
+                self.view = None
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+        except BufferError:
+            logging.warning(f'{self.path} is still referenced, unmapped on release')
+        self.file.close()
+
+    def get_executor(self):
+        """ Return the worker pool used for batch decoding """
+        with self.lock:
+            if not self.executor:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='nx')
+            return self.executor
+
+    def decode_images(self, nodes):
+        """ Decode image nodes in parallel, yields (node, data) as they finish """
+        if self.parent:
+            return self.parent.decode_images(nodes)
+        return decode_images(self.get_executor(), nodes)
+
+    def get_string(self, index):
+        """
+        Get string at index.
+        Strings are decoded on first use and interned, names such as
+        origin, delay or z repeat across millions of nodes.
+        """
+
+        string = self.strings.get(index)
+
+        if string is None:
+
+            # Move to location where the string is stored
+            if self.string_offsets is not None:
+                offset = self.string_offsets[index].item()
+            else:
+                offset = self.read_offset(self.string_offset, index)
+            length = self.unpack(NXFile._LENGTH, offset)[0]
+
+            # Read and save string
+            string = sys.intern(str(self.read(offset + 2, length), 'utf-8'))
+            return self.strings.setdefault(index, string)
+
+        return string
+
+    def get_file(self, name):
+        """ Return the file with the given base name """
+        if self.parent:
+            return self.parent.get_file(name)
+        return self if os.path.basename(self.path) == name else None
+
+    def resolve_outlink(self, value):
+        """ Return the image an _outlink value points to """
+
+        # Get path, the first segment names the original wz file
+        path = value[value.index('/')+1:]
+
+        # Resolve using parent fileset or current file
+        if self.parent:
+            node = self.parent.resolve(path)
+        else:
+            node = self.resolve(path)
+
+        return node.get_image() if node else None
+
+    def get_outlink(self, node):
+        """ Return the image an outlinked canvas points to, or None """
+
+        image_index = node.image_index
+
+        # Known outlink
+        link = self.outlinks.get(image_index)
+        if link:
+            name, offset, width, height = link
+            target = self.get_file(name)
+            if target:
+                return NXImage(target, offset, width, height)
+
+        # A complete scan already knows this node has no outlink
+        if self.outlinks.scanned:
+            return None
+
+        # Check for outlink node
+        outlink = node['_outlink']
+        if not outlink:
+            return None
+
+        # Resolve and remember
+        image = self.resolve_outlink(outlink.value)
+        if image:
+            self.outlinks.add(image_index, image)
+        return image
+
     def get_node(self, index):
-        """ Get node by index """
+        """ Get node by index. Safe to call from several threads. """
 
         # If node was already read
-        node = self.nodes[index]
+        node = self.nodes.get(index)
         if node:
             return node
 
-        # Move to location the node is stored
-        self.file.seek(self.node_offset + index * 20)  # offset by node size
+        # Create a view over the node table row, keep the first one stored
+        return self.nodes.setdefault(index, self.view_node(index))
 
-        # Read and save node
-        self.nodes[index] = NXNode.parse_node(self)
-        return self.nodes[index]
+    def view_node(self, index):
+        """ Create a node view without storing it in the node cache """
+        return NXNode(self, index, *self.headers[index].item())
+
+    def get_nodes(self, first, count):
+        """
+        Get a contiguous range of nodes, such as the children of one node.
+        The whole block is decoded in one pass instead of row by row.
+        """
+
+        nodes = []
+        rows = self.headers[first:first + count].tolist()
+        for index, row in enumerate(rows, first):
+
+            # If node was already read
+            node = self.nodes.get(index)
+            if not node:
+                node = self.nodes.setdefault(index, NXNode(self, index, *row))
+            nodes.append(node)
+
+        return nodes
 
     def get_root_node(self):
         """ Return root node """
         return self.get_node(0)
 
     def resolve(self, path):
-        """ Resolve path starting from root """
-        return self.get_root_node().resolve(path)
+        """
+        Resolve path starting from root.
+        Results are memoized per path, misses included. An uncached path
+        resolves its parent first, so a/b/c/d starts from a cached a/b/c.
+        """
+
+        # Check the cache
+        node = self.resolved.get(path, NXFile._MISSING)
+        if node is not NXFile._MISSING:
+            return node
+
+        # Probe the path index for directories
+        if self.index:
+            index = self.index.lookup(path)
+            if index is not None:
+                return self.resolved.put(path, self.get_node(index))
+
+        # Resolve from the parent directory
+        parent_path, _, name = path.rpartition('/')
+        parent = self.resolve(parent_path) if parent_path else self.get_root_node()
+        node = parent.get_child(name) if parent else None
+
+        # Store and return
+        return self.resolved.put(path, node)
+
+    def resolve_stats(self):
+        """ Return hit rate statistics for path resolution """
+        return self.resolved.stats()
+
+    def memory_usage(self):
+        """ Return an estimate of the bytes held by each cache """
+
+        def estimate(cache, values):
+            container = sys.getsizeof(
+                cache.entries if isinstance(cache, LRUCache) else cache)
+            return container + sum(sys.getsizeof(value) for value in values)
+
+        # Node objects are all the same size, lru entries are (node, size)
+        if isinstance(self.nodes, LRUCache):
+            nodes = [entry[0] for entry in list(self.nodes.entries.values())]
+        else:
+            nodes = list(self.nodes.values())
+        node_size = sys.getsizeof(nodes[0]) if nodes else 0
+
+        return {
+            'nodes': estimate(self.nodes, ()) + node_size * len(nodes),
+            'strings': estimate(self.strings, list(self.strings.values())),
+            'images': estimate(self.images, ()) + sum(
+                sys.getsizeof(image) + sys.getsizeof(image.__dict__)
+                for image in list(self.images.values())),
+            'sounds': estimate(self.sounds, ()) + sum(
+                sys.getsizeof(sound) + sys.getsizeof(sound.__dict__)
+                for sound in list(self.sounds.values())),
+            'resolved': estimate(self.resolved, ()),
+            'pixels': self.pixels.size if not self.parent else 0,
+        }
+
+    def walk(self, path=None, **kwargs):
+        """ Stream (path, node) pairs below path, see NXNode.walk """
+
+        # Start from root or the given path
+        node = self.resolve(path) if path else self.get_root_node()
+        if not node:
+            return iter(())
+
+        return node.walk(prefix=path, **kwargs)
 
 
 class NXFileSet:
     """ Create a set of nx files that share data """
 
-    def __init__(self, *argv):
+    def __init__(self, *argv, workers=None,
+                 pixel_cache_size=NXFile.PIXEL_CACHE_SIZE, **options):
+        """ Extra options are passed to each NXFile """
 
+        self.options = options
+        self.workers = workers
+        self.pixels = LRUCache(pixel_cache_size, sizeof=len)
+        self.executor = None
+        self.lock = threading.Lock()
         self.nxfiles = []
+        self.routes = {}
         for arg in argv:
             self.load(arg)
 
@@ -98,16 +443,85 @@ class NXFileSet:
             return
 
         # Create nx file, set parent to self
-        self.nxfiles.append(NXFile(path=path, parent=self))
+        nxfile = NXFile(path=path, parent=self, **self.options)
+        self.nxfiles.append(nxfile)
+
+        # Route each top-level directory to the files that own it
+        for name in nxfile.get_root_node().list_children():
+            self.routes.setdefault(name, []).append(nxfile)
+
+    def get_executor(self):
+        """ Return the worker pool shared by every file in the set """
+        with self.lock:
+            if not self.executor:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='nx')
+            return self.executor
+
+    def decode_images(self, nodes):
+        """ Decode image nodes in parallel, yields (node, data) as they finish """
+        return decode_images(self.get_executor(), nodes)
+
+    def get_file(self, name):
+        """ Return the file with the given base name """
+        for nxfile in self.nxfiles:
+            if os.path.basename(nxfile.path) == name:
+                return nxfile
+        return None
+
+    def scan_outlinks(self, background=True):
+        """
+        Build the outlink table of every file that has no complete one yet.
+        Runs once in a background thread unless background is False.
+        """
+
+        def scan():
+            for nxfile in self.nxfiles:
+                if not nxfile.outlinks.scanned:
+                    nxfile.outlinks.scan()
+
+        if not background:
+            return scan()
+
+        thread = threading.Thread(target=scan, name='nx-outlinks', daemon=True)
+        thread.start()
+        return thread
+
+    def save_outlinks(self):
+        """ Persist outlinks found so far """
+        for nxfile in self.nxfiles:
+            nxfile.outlinks.save()
+
+    def memory_usage(self):
+        """ Return the bytes held by the caches of every file """
+
+        usage = {'pixels': self.pixels.size}
+        for nxfile in self.nxfiles:
+            for key, value in nxfile.memory_usage().items():
+                usage[key] = usage.get(key, 0) + value
+        return usage
+
+    def close(self):
+        """ Close the worker pool and every file """
+
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for nxfile in self.nxfiles:
+            nxfile.close()
 
     def resolve(self, path):
-        """ Resolve for each file (DFS-like) """
+        """ Resolve in the files that own the first path segment """
 
         # Attempt to resolve until success
-        for nxfile in self.nxfiles:
+        for nxfile in self.routes.get(path.split('/', 1)[0], ()):
             node = nxfile.resolve(path)
             if node:
                 return node
 
         logging.warning(f'{path} failed to resolve')
         return None
+
+    def resolve_stats(self):
+        """ Return path resolution statistics for each file """
+        return {nxfile.path: nxfile.resolve_stats() for nxfile in self.nxfiles}
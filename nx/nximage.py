@@ -1,17 +1,37 @@
+import struct
+
 import lz4.block
 
 
 class NXImage:
 
+    _SIZE = struct.Struct('<I')
+
     def __init__(self, nxfile, offset, width, height):
         self.nxfile = nxfile
         self.offset = offset
         self.width = width
         self.height = height
 
+    def get_compressed(self):
+        """ Get the lz4 block, a zero-copy view when the file is mapped """
+        compressed_size = self.nxfile.unpack(NXImage._SIZE, self.offset)[0]
+        return self.nxfile.read(self.offset + 4, compressed_size)
+
     def get_data(self):
-        """ Get image data """
-        self.nxfile.file.seek(self.offset)
-        compressed_size = int.from_bytes(self.nxfile.file.read(4), 'little')
-        compressed_bytes = self.nxfile.file.read(compressed_size)
-        return lz4.block.decompress(compressed_bytes, self.width * self.height * 4, True)
+        """
+        Get image data.
+        Decoded pixels are kept in the file's byte-budgeted pixel cache,
+        callers get their own copy since sprites swap channels in place.
+        """
+
+        # Check the pixel cache
+        key = (self.nxfile.path, self.offset)
+        data = self.nxfile.pixels.get(key)
+
+        # Decompress and store
+        if data is None:
+            data = self.nxfile.pixels.put(key, lz4.block.decompress(
+                self.get_compressed(), self.width * self.height * 4))
+
+        return bytearray(data)
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+
+import numpy
+
+from nx import nxsidecar
+
+
+class NXIndex:
+    """
+    Sidecar path index for an nx file.
+
+    Holds an open addressing hash table of path hash -> node index for every
+    directory-level node (nodes with children). The sidecar is memory-mapped,
+    so a deep resolve becomes a hash probe instead of a walk from the root.
+    It is only used while the nx file keeps the same size and modification
+    time.
+
+    Build it with:
+        python -m nx.nxindex path/to/map.nx [...]
+    """
+
+    SUFFIX = '.index'
+
+    # magic, nx size, nx mtime, slot count
+    _MAGIC = b'NXIX'
+    _HEADER = struct.Struct('<4sQQQ')
+
+    def __init__(self, nxfile, file, map):
+
+        self.nxfile = nxfile
+        self.file = file
+        self.map = map
+
+        # Slots
+        count = NXIndex._HEADER.unpack_from(map)[3]
+        self.mask = count - 1
+        self.hashes = numpy.frombuffer(
+            map, '<u8', count, NXIndex._HEADER.size)
+        self.nodes = numpy.frombuffer(
+            map, '<u4', count, NXIndex._HEADER.size + count * 8)
+
+    @staticmethod
+    def hash(path):
+        """ Stable 64-bit hash of a path, 0 marks an empty slot """
+        value = int.from_bytes(hashlib.blake2b(
+            path.encode('utf-8'), digest_size=8).digest(), 'little')
+        return value or 1
+
+    @staticmethod
+    def open(nxfile):
+        """ Map the sidecar of nxfile, returns None if missing or stale """
+
+        path = nxfile.path + NXIndex.SUFFIX
+        if not os.path.isfile(path):
+            return None
+
+        file = None
+        map = None
+        try:
+            file = open(path, 'rb')
+            map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            # Check header
+            magic, size, mtime, count = NXIndex._HEADER.unpack_from(map)
+            expected = NXIndex._HEADER.size + count * 12
+            if (magic == NXIndex._MAGIC and (size, mtime) == nxsidecar.stamp(nxfile.path)
+                    and len(map) >= expected and not count & (count - 1)):
+                return NXIndex(nxfile, file, map)
+
+            logging.info(f'{path} is out of date')
+
+        except (OSError, ValueError, struct.error):
+            logging.exception(f'Unable to read {path}')
+
+        # Release the sidecar so it can be rebuilt
+        if map:
+            map.close()
+        if file:
+            file.close()
+        return None
+
+    def close(self):
+        """ Release the mapping """
+        self.hashes = None
+        self.nodes = None
+        self.map.close()
+        self.file.close()
+
+    def lookup(self, path):
+        """ Return the node index of a directory-level path, or None """
+
+        key = NXIndex.hash(path)
+        slot = key & self.mask
+        name = path.rpartition('/')[2]
+
+        # Linear probe until an empty slot
+        while True:
+            found = self.hashes[slot].item()
+            if not found:
+                return None
+            if found == key:
+                index = self.nodes[slot].item()
+                if self.nxfile.get_string(self.nxfile.table['name'][index].item()) == name:
+                    return index
+            slot = (slot + 1) & self.mask
+
+    @staticmethod
+    def build(nxfile):
+        """ Write the sidecar index for an open nx file """
+
+        # Hash every directory-level node
+        entries = [(NXIndex.hash(path), node.index)
+                   for path, node in nxfile.walk(prune=lambda path, node: not node.child_count)]
+
+        # Half full table, size is a power of two
+        count = 1
+        while count < 2 * len(entries) + 1:
+            count <<= 1
+        mask = count - 1
+        hashes = [0] * count
+        nodes = [0] * count
+
+        # Insert
+        for key, index in entries:
+            slot = key & mask
+            while hashes[slot]:
+                slot = (slot + 1) & mask
+            hashes[slot] = key
+            nodes[slot] = index
+
+        # Write
+        path = nxfile.path + NXIndex.SUFFIX
+        size, mtime = nxsidecar.stamp(nxfile.path)
+        nxsidecar.write(path, [
+            NXIndex._HEADER.pack(NXIndex._MAGIC, size, mtime, count),
+            numpy.array(hashes, dtype='<u8').tobytes(),
+            numpy.array(nodes, dtype='<u4').tobytes()])
+
+        logging.info(f'{path}: {len(entries)} paths')
+        return path
+
+
+if __name__ == '__main__':
+
+    from nx.nxfile import NXFile
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(module)s %(message)s',
+                        datefmt='%H:%M:%S',
+                        level=logging.INFO)
+
+    # Build an index for each nx file
+    for arg in sys.argv[1:]:
+        nxfile = NXFile(arg, path_index=False)
+        NXIndex.build(nxfile)
+        nxfile.close()
@@ -1,156 +1,261 @@
-import struct
+import collections
+
+import numpy
 
 from nx.nximage import NXImage
 from nx.nxsound import NXSound
 
 
 class NXNode():
+    """
+    Lightweight view over one row of the nx file's node table.
+
+    Only the header fields are kept on the object, the 8 byte payload is
+    decoded from the table when a value is requested.
+    """
+
+    # Node record layout, 12 byte header followed by 8 bytes of data.
+    # The payload fields overlap, the node type decides which one is valid.
+    DTYPE = numpy.dtype({
+        'names': ['name', 'child', 'count', 'type',
+                  'long', 'double', 'string', 'x', 'y',
+                  'image', 'width', 'height', 'sound', 'length'],
+        'formats': ['<u4', '<u4', '<u2', '<u2',
+                    '<i8', '<f8', '<u4', '<i4', '<i4',
+                    '<u4', '<u2', '<u2', '<u4', '<u4'],
+        'offsets': [0, 4, 8, 10,
+                    12, 12, 12, 12, 16,
+                    12, 16, 18, 12, 16],
+        'itemsize': 20})
+
+    # Header fields only, decoded in bulk when materializing child ranges
+    HEADER_DTYPE = numpy.dtype({
+        'names': ['name', 'child', 'count', 'type'],
+        'formats': ['<u4', '<u4', '<u2', '<u2'],
+        'offsets': [0, 4, 8, 10],
+        'itemsize': 20})
+
+    __slots__ = ('nxfile', 'index', 'name_index', 'child_index',
+                 'child_count', 'type', '__weakref__')
+
+    def __init__(self, nxfile, index, name_index, child_index, child_count, type):
 
-    def __init__(self,  nxfile, name_index, child_index, child_count, type):
+        # Check type
+        if type > 6:
+            raise Exception(
+                'Failed to parse node. Encountered invalid node type', type)
 
         # Constructor
         self.nxfile = nxfile
+        self.index = index
         self.name_index = name_index
         self.child_index = child_index
         self.child_count = child_count
         self.type = type
 
-        # Children
-        self.child_map = {}
-
-        # String
-        self.string_index = None
-
-        # Image
-        self.image_index = None
-        self.width = None
-        self.height = None
-
-        # Sound
-        self.sound_index = None
-        self.length = None
-
-        # Value
-        self._value = None
-
     def __getitem__(self, key):
         return self.get_child(key)
 
+    def field(self, name):
+        """ Read a payload field of this node from the node table """
+        return self.nxfile.table[name][self.index].item()
+
     @property
     def name(self):
         return self.get_string(self.name_index)
 
     @property
     def value(self):
-        return self._value
+        if self.type == 1:  # long
+            return self.field('long')
+        if self.type == 2:  # double
+            return self.field('double')
+        if self.type == 3:  # string
+            return self.get_string(self.string_index)
+        if self.type == 4:  # point
+            return (self.x, self.y)
+        return None
 
-    @value.setter
-    def value(self, value):
-        self._value = value
+    @property
+    def string_index(self):
+        return self.field('string') if self.type == 3 else None
 
-    def populate_children(self):
-        """ Populates immediate child nodes. No-ops if ran more than once. """
+    @property
+    def x(self):
+        return self.field('x') if self.type == 4 else None
 
-        # Check if there are any children or already populated
-        if self.child_count == 0 or self.child_map:
-            return
+    @property
+    def y(self):
+        return self.field('y') if self.type == 4 else None
 
-        # Populate child map
-        child_map = {}
-        for i in range(self.child_index, self.child_index + self.child_count):
-            child_node = self.nxfile.get_node(i)
-            child_map[child_node.name] = child_node
+    @property
+    def image_index(self):
+        return self.field('image') if self.type == 5 else None
 
-        # Update variable
-        self.child_map = child_map
+    @property
+    def width(self):
+        return self.field('width') if self.type == 5 else None
 
-    def list_children(self):
-        """ Lists names of children nodes. """
-        self.populate_children()
-        return list(self.child_map.keys())
+    @property
+    def height(self):
+        return self.field('height') if self.type == 5 else None
 
-    def get_children(self):
-        """ Get children nodes as a list. """
-        self.populate_children()
-        return list(self.child_map.values())
+    @property
+    def sound_index(self):
+        return self.field('sound') if self.type == 6 else None
 
-    def get_child(self, name):
-        """ Get child node by name """
-        self.populate_children()
-        return self.child_map.get(name)
+    @property
+    def length(self):
+        return self.field('length') if self.type == 6 else None
 
-    def get_string(self, index):
-        """ Get string at current index """
+    def iter_children(self):
+        """ Lazily iterate over children nodes. """
+        for i in range(self.child_index, self.child_index + self.child_count):
+            yield self.nxfile.get_node(i)
 
-        string = self.nxfile.strings.get(index)
+    def list_children(self):
+        """ Lists names of children nodes. """
+        names = self.nxfile.table['name'][
+            self.child_index:self.child_index + self.child_count]
+        return [self.get_string(index) for index in names.tolist()]
+
+    def get_children(self, prefetch=0):
+        """
+        Get children nodes as a list.
+        The child range is decoded in a single pass, prefetch also
+        materializes that many more levels below each child.
+        """
 
-        if not string:
+        children = self.nxfile.get_nodes(self.child_index, self.child_count)
 
-            # Move to string index
-            self.nxfile.file.seek(
-                self.nxfile.string_offset + index * 8)
+        # Warm deeper levels of directory-heavy subtrees
+        if prefetch > 0:
+            for child in children:
+                if child.child_count:
+                    child.get_children(prefetch - 1)
 
-            # Move to location where the string is stored
-            self.nxfile.file.seek(int.from_bytes(
-                self.nxfile.file.read(8), 'little'))
-            length = int.from_bytes(self.nxfile.file.read(2), 'little')
+        return children
 
-            # Read and save string
-            self.nxfile.strings[index] = self.nxfile.file.read(
-                length).decode('utf-8')
-            return self.nxfile.strings[index]
+    def get_child(self, name):
+        """
+        Get child node by name.
+        Children are stored sorted by name, so binary search the child
+        range against the string table instead of reading every sibling.
+        """
+
+        names = self.nxfile.table['name']
+        low = self.child_index
+        high = self.child_index + self.child_count
+
+        # Search
+        while low < high:
+            mid = (low + high) // 2
+            child_name = self.get_string(names[mid].item())
+            if child_name < name:
+                low = mid + 1
+            elif child_name > name:
+                high = mid
+            else:
+                return self.nxfile.get_node(mid)
+
+        return None
+
+    def walk(self, order='dfs', max_depth=None, prune=None, types=None, prefix=None):
+        """
+        Stream (path, node) pairs for every node below this one.
+
+        Args:
+            order (str): 'dfs' (pre-order) or 'bfs'
+            max_depth (int): deepest level to visit, children are depth 1
+            prune (callable): prune(path, node) returns True to skip a subtree
+            types (iterable[int]): only yield nodes of these types
+            prefix (str): path prepended to every yielded path
+
+        Nodes are created as uncached views and only pending child ranges
+        are kept, so memory stays bounded and the node cache is untouched.
+        """
+
+        nxfile = self.nxfile
+        types = set(types) if types is not None else None
+
+        # Pending child ranges as (path, depth, first child, child count)
+        pending = collections.deque([(prefix, 1, self.child_index, self.child_count)])
+        while pending:
+
+            # DFS keeps a cursor into the newest range, BFS takes the oldest
+            if order == 'dfs':
+                path, depth, first, count = pending.pop()
+                if count > 1:
+                    pending.append((path, depth, first + 1, count - 1))
+                indices = (first,) if count else ()
+            else:
+                path, depth, first, count = pending.popleft()
+                indices = range(first, first + count)
+
+            for index in indices:
+
+                # Create view
+                node = nxfile.view_node(index)
+                name = node.name
+                node_path = f'{path}/{name}' if path else name
+
+                # Skip subtree
+                if prune and prune(node_path, node):
+                    continue
+
+                # Yield matching nodes
+                if types is None or node.type in types:
+                    yield node_path, node
+
+                # Queue children
+                if node.child_count and (max_depth is None or depth < max_depth):
+                    pending.append(
+                        (node_path, depth + 1, node.child_index, node.child_count))
 
-        return string
+    def get_string(self, index):
+        """ Get string at current index """
+        return self.nxfile.get_string(index)
 
     def get_image(self):
         """ Get image at current index """
 
-        image = self.nxfile.images.get(self.image_index)
+        image_index = self.image_index
+        image = self.nxfile.images.get(image_index)
 
         if not image:
 
             # Check for outlink node
-            if self['_outlink']:
-
-                # Get path
-                value = self['_outlink'].value
-                path = value[value.index('/')+1:]
-
-                # Resolve using parent fileset or current file
-                if self.nxfile.parent:
-                    outlink_node = self.nxfile.parent.resolve(path)
-                else:
-                    outlink_node = self.nxfile.resolve(path)
-
-                # Return outlink node
-                if outlink_node:
-                    image = outlink_node.get_image()
-                    self.nxfile.images[self.image_index] = image
-                    return image
+            image = self.nxfile.get_outlink(self)
+            if image:
+                return self.nxfile.images.setdefault(image_index, image)
 
             # Load image from node
-            self.nxfile.file.seek(
-                self.nxfile.image_offset + self.image_index * 8)
-            offset = int.from_bytes(self.nxfile.file.read(8), 'little')
+            offset = self.nxfile.read_offset(
+                self.nxfile.image_offset, image_index)
             image = NXImage(self.nxfile, offset, self.width, self.height)
-            self.nxfile.images[self.image_index] = image
+            image = self.nxfile.images.setdefault(image_index, image)
 
         return image
 
-    def get_sound(self):
-        """ Get sound at current index """
+    def get_nxsound(self):
+        """ Get the sound object at current index """
 
-        sound = self.nxfile.sounds.get(self.sound_index)
+        sound_index = self.sound_index
+        sound = self.nxfile.sounds.get(sound_index)
 
         if not sound:
 
             # Load sound from node
-            self.nxfile.file.seek(
-                self.nxfile.sound_offset + self.sound_index * 8)
-            offset = int.from_bytes(self.nxfile.file.read(8), 'little')
-            sound = NXSound(self.nxfile, offset)
-            self.nxfile.sounds[self.sound_index] = sound
+            offset = self.nxfile.read_offset(
+                self.nxfile.sound_offset, sound_index)
+            sound = NXSound(self.nxfile, offset, self.length)
+            sound = self.nxfile.sounds.setdefault(sound_index, sound)
+
+        return sound
 
+    def get_sound(self):
+        """ Get sound at current index """
+        sound = self.get_nxsound()
         return sound.get_data(self.length) if sound else None
 
     def resolve(self, path):
@@ -164,49 +269,3 @@ class NXNode():
                 return None
 
         return node
-
-    @staticmethod
-    def parse_node(nxfile):
-        """ Parse the node at the current file pointer """
-
-        file = nxfile.file
-
-        # Unpack format
-        # https://docs.python.org/3/library/struct.html#format-characters
-        data = struct.unpack('<IIHH', file.read(12))
-
-        # Create node
-        node = NXNode(nxfile,
-                      name_index=data[0],
-                      child_index=data[1],
-                      child_count=data[2],
-                      type=data[3])
-
-        # Check type
-        if node.type == 0:  # no data
-            file.seek(8, 1)  # skip 8 bytes
-        elif node.type == 1:  # long
-            node.value = int.from_bytes(file.read(8), 'little', signed=True)
-        elif node.type == 2:  # double
-            node.value = struct.unpack('<d', file.read(8))
-        elif node.type == 3:  # string
-            node.string_index = int.from_bytes(file.read(4), 'little')
-            node.value = node.get_string(node.string_index)
-        elif node.type == 4:  # point
-            node.x = int.from_bytes(file.read(4), 'little', signed=True)
-            node.y = int.from_bytes(file.read(4), 'little', signed=True)
-            node.value = (node.x, node.y)
-        elif node.type == 5:  # image
-            node.image_index = int.from_bytes(file.read(4), 'little')
-            node.width = int.from_bytes(file.read(2), 'little')
-            node.height = int.from_bytes(file.read(2), 'little')
-            # node.value = node.get_image()
-        elif node.type == 6:  # sound
-            node.sound_index = int.from_bytes(file.read(4), 'little')
-            node.length = int.from_bytes(file.read(4), 'little')
-            # node.value = node.get_sound()
-        else:
-            raise Exception(
-                'Failed to parse node. Encountered invalid node type', node.type)
-
-        return node
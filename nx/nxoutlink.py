@@ -0,0 +1,172 @@
+import logging
+import os
+import struct
+import threading
+
+import numpy
+
+from nx import nxsidecar
+
+
+class NXOutlinks:
+    """
+    Image index -> target image table for outlinked canvases of one nx file.
+
+    Targets are stored as (file, image offset, width, height) so an outlink
+    resolves in O(1) without parsing the _outlink string or resolving its
+    path again. The size is the target's, placeholder canvases may differ. The
+    table is filled lazily, or all at once by scan(), and persisted next to
+    the nx file. The sidecar is only trusted while the nx file keeps the
+    same size and modification time.
+    """
+
+    SUFFIX = '.outlink'
+
+    # magic, nx size, nx mtime, scanned, names length
+    _MAGIC = b'NXO2'
+    _HEADER = struct.Struct('<4sQQII')
+
+    def __init__(self, nxfile):
+
+        self.nxfile = nxfile
+        self.path = nxfile.path + NXOutlinks.SUFFIX
+        self.lock = threading.Lock()
+
+        # File names, id 0 means no outlink
+        self.names = ['']
+        self.offsets = numpy.zeros(nxfile.image_count, dtype='<u8')
+        self.widths = numpy.zeros(nxfile.image_count, dtype='<u2')
+        self.heights = numpy.zeros(nxfile.image_count, dtype='<u2')
+        self.files = numpy.zeros(nxfile.image_count, dtype='u1')
+
+        # A complete scan means every outlink is in the table
+        self.scanned = False
+        self.dirty = False
+
+        self.load()
+
+    def load(self):
+        """ Load the sidecar if it matches the nx file """
+
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+
+            # Check header
+            magic, size, mtime, scanned, length = NXOutlinks._HEADER.unpack_from(data)
+            if magic != NXOutlinks._MAGIC or (size, mtime) != nxsidecar.stamp(self.nxfile.path):
+                logging.info(f'{self.path} is out of date')
+                return
+
+            # Read file names and tables
+            offset = NXOutlinks._HEADER.size
+            names = data[offset:offset + length].decode('utf-8').split('\n')
+            offset += length + (-length % 8)
+            count = self.nxfile.image_count
+            offsets = numpy.frombuffer(data, '<u8', count, offset)
+            widths = numpy.frombuffer(data, '<u2', count, offset + count * 8)
+            heights = numpy.frombuffer(data, '<u2', count, offset + count * 10)
+            files = numpy.frombuffer(data, 'u1', count, offset + count * 12)
+
+            # Update variables
+            self.names = names
+            self.offsets = offsets.copy()
+            self.widths = widths.copy()
+            self.heights = heights.copy()
+            self.files = files.copy()
+            self.scanned = bool(scanned)
+
+        except (OSError, ValueError, struct.error):
+            logging.exception(f'Unable to read {self.path}')
+
+    def save(self):
+        """ Write the sidecar if the table changed """
+
+        if not self.dirty:
+            return
+
+        try:
+            with self.lock:
+
+                # Build header
+                names = '\n'.join(self.names).encode('utf-8')
+                size, mtime = nxsidecar.stamp(self.nxfile.path)
+                header = NXOutlinks._HEADER.pack(
+                    NXOutlinks._MAGIC, size, mtime, self.scanned, len(names))
+
+                # Write
+                nxsidecar.write(self.path, [
+                    header, names, bytes(-len(names) % 8),
+                    self.offsets.tobytes(), self.widths.tobytes(),
+                    self.heights.tobytes(), self.files.tobytes()])
+                self.dirty = False
+
+        except OSError:
+            logging.exception(f'Unable to write {self.path}')
+
+    def get(self, image_index):
+        """ Return (file name, image offset, width, height) for an outlinked image """
+        file = self.files[image_index]
+        if not file:
+            return None
+        return (self.names[file], self.offsets[image_index].item(),
+                self.widths[image_index].item(), self.heights[image_index].item())
+
+    def add(self, image_index, image):
+        """ Record the image an outlinked canvas points to """
+
+        name = os.path.basename(image.nxfile.path)
+        with self.lock:
+            if name not in self.names:
+                self.names.append(name)
+
+            # get() reads without the lock, the file id marks the entry as
+            # complete so it is written last
+            self.offsets[image_index] = image.offset
+            self.widths[image_index] = image.width
+            self.heights[image_index] = image.height
+            self.files[image_index] = self.names.index(name)
+            self.dirty = True
+
+    def scan(self):
+        """ Find every outlinked canvas in the file and save the table """
+
+        nxfile = self.nxfile
+        table = nxfile.table
+
+        # Image nodes with children are the only outlink candidates
+        candidates = numpy.flatnonzero(
+            (table['type'] == 5) & (table['count'] > 0))
+        counts = table['count'][candidates].astype(numpy.int64)
+
+        # Expand each candidate's child range
+        parents = numpy.repeat(candidates, counts)
+        starts = numpy.repeat(table['child'][candidates], counts).astype(numpy.int64)
+        steps = numpy.arange(counts.sum()) - numpy.repeat(
+            numpy.cumsum(counts) - counts, counts)
+        children = starts + steps
+
+        # Find children named _outlink, names repeat so only decode each once
+        names = table['name'][children]
+        unique = numpy.unique(names)
+        outlink = [index for index in unique.tolist()
+                   if nxfile.get_string(index) == '_outlink']
+        mask = numpy.isin(names, outlink) & (table['type'][children] == 3)
+
+        # Resolve each outlink once
+        for parent, child in zip(parents[mask].tolist(), children[mask].tolist()):
+            image_index = table['image'][parent].item()
+            if self.files[image_index]:
+                continue
+            value = nxfile.get_string(table['string'][child].item())
+            image = nxfile.resolve_outlink(value)
+            if image:
+                self.add(image_index, image)
+
+        # Store
+        self.scanned = True
+        self.dirty = True
+        self.save()
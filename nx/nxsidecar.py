@@ -0,0 +1,17 @@
+import os
+
+
+def stamp(path):
+    """ Return the size and mtime of an nx file, sidecars are valid for one stamp """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write(path, chunks):
+    """ Write chunks to a temporary file, then swap it in so readers never see a partial file """
+
+    temp = path + '.tmp'
+    with open(temp, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+    os.replace(temp, path)
@@ -1,10 +1,88 @@
+import io
+import struct
+from collections import namedtuple
+
+# Wave format stored in front of the sound payload
+NXSoundHeader = namedtuple('NXSoundHeader', [
+    'format', 'channels', 'sample_rate', 'byte_rate',
+    'block_align', 'bits_per_sample', 'payload_offset'])
+
+
 class NXSound:
 
-    def __init__(self, nxfile, offset):
+    # 51 byte wz sound header, 1 byte format length, then WAVEFORMATEX
+    _FORMAT_LENGTH = 51
+    _FORMAT = struct.Struct('<HHIIHH')
+    _BYTE = struct.Struct('<B')
+
+    # Format tags
+    PCM = 0x0001
+    MP3 = 0x0055
+
+    def __init__(self, nxfile, offset, length=None):
+        self.nxfile = nxfile
+        self.offset = offset
+        self.length = length
+        self.header = None
+
+    def get_data(self, length=None):
+        """ Get sound data, a zero-copy view when the file is mapped """
+        return self.nxfile.read(self.offset, length or self.length)
+
+    def get_header(self):
+        """ Parse the wave format header """
+
+        if not self.header:
+            size = self.nxfile.unpack(
+                NXSound._BYTE, self.offset + NXSound._FORMAT_LENGTH)[0]
+            fields = self.nxfile.unpack(
+                NXSound._FORMAT, self.offset + NXSound._FORMAT_LENGTH + 1)
+            self.header = NXSoundHeader(
+                *fields, payload_offset=NXSound._FORMAT_LENGTH + 1 + size)
+
+        return self.header
+
+    def get_payload(self):
+        """ Get the encoded audio after the header, without copying when mapped """
+        start = self.get_header().payload_offset
+        return self.nxfile.read(self.offset + start, self.length - start)
+
+    def open(self):
+        """ Open the payload as a read-only file-like object """
+        start = self.get_header().payload_offset
+        return NXSoundReader(self.nxfile, self.offset + start, self.length - start)
+
+
+class NXSoundReader(io.RawIOBase):
+    """ Seekable file-like reader over a sound payload, reads in chunks """
+
+    def __init__(self, nxfile, offset, length):
+        super().__init__()
         self.nxfile = nxfile
         self.offset = offset
+        self.length = length
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.length
+        self.position = max(0, offset)
+        return self.position
 
-    def get_data(self, length):
-        """ Get sound data """
-        self.nxfile.file.seek(self.offset)
-        return self.nxfile.file.read(length)
+    def readinto(self, buffer):
+        size = max(0, min(len(buffer), self.length - self.position))
+        if size:
+            buffer[:size] = self.nxfile.read(self.offset + self.position, size)
+            self.position += size
+        return size
@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+import pygame
+
+from maplepy.game import asyncloop
+
+
+def test_asyncloop_run():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((8, 8))
+
+    # Events posted before the coroutine finishes reach the handler
+    events = []
+    pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+
+    async def main():
+        await asyncio.sleep(0.05)
+        return 42
+
+    assert asyncloop.run(main(), fps=100, handler=events.append) == 42
+    assert any(event.type == pygame.USEREVENT for event in events)
+    pygame.display.quit()
@@ -0,0 +1,94 @@
+import os
+import random
+
+import pygame
+import pytest
+
+from maplepy.display.atlas import Atlas
+
+
+class Sprite:
+    """ Holds an image like SpriteNx """
+
+    def __init__(self, w, h, seed):
+        rng = random.Random(seed)
+        self.image = pygame.Surface((w, h), pygame.SRCALPHA)
+        for x in range(w):
+            for y in range(h):
+                self.image.set_at((x, y), [rng.randrange(256) for _ in range(4)])
+        self.pixels = pygame.image.tostring(self.image, 'RGBA')
+
+    def intact(self):
+        return pygame.image.tostring(self.image, 'RGBA') == self.pixels
+
+
+@pytest.fixture(autouse=True)
+def display():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((8, 8))
+    yield
+    pygame.display.quit()
+
+
+def fill(atlas, count, seed=0):
+    rng = random.Random(seed)
+    sprites = {f'{i}': Sprite(rng.randint(2, 24), rng.randint(2, 24), i) for i in range(count)}
+    for key, sprite in sprites.items():
+        assert atlas.add('Tile/a', key, sprite)
+    return sprites
+
+
+def test_atlas_no_overlap():
+    atlas = Atlas(size=128, max_size=32, page_size=32)
+    fill(atlas, 80)
+    rects = [(page, rect) for _, page, rect, _ in atlas.entries.values()]
+    for i, (page, rect) in enumerate(rects):
+        assert page.surface.get_rect().contains(rect)
+        for other_page, other in rects[i + 1:]:
+            assert other_page is not page or not rect.colliderect(other)
+
+
+def test_atlas_grow_keeps_pixels():
+    atlas = Atlas(size=256, max_size=32, page_size=16)
+    sprites = fill(atlas, 60)
+    assert atlas.groups['Tile/a'][0].size > 16
+    for key, sprite in sprites.items():
+        assert sprite.intact()
+        assert sprite.image.get_parent() is atlas.entries[key][1].surface
+
+    # Too big to pack
+    assert not atlas.add('Tile/a', 'big', Sprite(40, 4, 0))
+
+
+def test_atlas_remove_drops_empty_pages():
+    atlas = Atlas(size=64, max_size=32, page_size=64)
+    sprites = fill(atlas, 30)
+    assert len(atlas.groups['Tile/a']) > 1
+    for key in sprites:
+        atlas.remove(key)
+    assert not atlas.groups
+    assert not atlas.entries
+    assert atlas.memory_usage() == 0
+
+
+def test_atlas_defragment():
+    atlas = Atlas(size=64, max_size=32, page_size=64)
+    sprites = fill(atlas, 30)
+
+    # Nothing freed, nothing moves
+    parents = {key: sprite.image.get_parent() for key, sprite in sprites.items()}
+    atlas.defragment()
+    assert all(sprite.image.get_parent() is parents[key] for key, sprite in sprites.items())
+
+    # Mostly freed, survivors are repacked into fewer pages
+    pages = len(atlas.groups['Tile/a'])
+    keep = list(sprites)[-3:]
+    for key in list(sprites)[:-3]:
+        atlas.remove(key)
+    atlas.defragment()
+    assert len(atlas.groups['Tile/a']) < pages
+    assert atlas.get_holes('Tile/a') == 0
+    for key in keep:
+        assert sprites[key].intact()
+        assert sprites[key].image.get_parent() is atlas.entries[key][1].surface
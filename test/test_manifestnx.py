@@ -0,0 +1,46 @@
+import threading
+
+from maplepy.nx.manifestnx import ManifestNx
+
+
+class PreloadRecorder:
+    """ Stands in for ResourceNx, records preloaded keys """
+
+    def __init__(self):
+        self.preloaded = []
+
+    def preload(self, file, keys):
+        self.preloaded.append(keys)
+
+
+def test_manifestnx_save_load(tmp_path):
+    manifests = ManifestNx(str(tmp_path), PreloadRecorder())
+    assert manifests.load('000010000') is None
+
+    usage = {('Tile', 'grassySoil', 'bsc', '0'): 21600,
+             (None, 'MapHelper', 'portal', 'game/pv/default/0'): 100}
+    manifests.save('000010000', usage)
+    assert dict(manifests.load('000010000')) == usage
+
+
+def test_manifestnx_warm_budget(tmp_path):
+    recorder = PreloadRecorder()
+    manifests = ManifestNx(str(tmp_path), recorder, warm_size=1000)
+    manifests.save('1', {('Tile', 'a', 'u', '0'): 600})
+    manifests.save('2', {('Tile', 'b', 'u', '0'): 600})
+    manifests.save('3', {('Tile', 'c', 'u', '0'): 400})
+
+    # Map 2 does not fit after map 1, unknown maps are skipped
+    manifests.run(None, ['1', '2', 'unknown', '3'], threading.Event())
+    assert recorder.preloaded == [[('Tile', 'a', 'u', '0')], [('Tile', 'c', 'u', '0')]]
+
+    # A cancelled run does nothing
+    cancelled = threading.Event()
+    cancelled.set()
+    manifests.run(None, ['1'], cancelled)
+    assert len(recorder.preloaded) == 2
+
+    # Background run
+    manifests.start(None, ['3'])
+    manifests.wait()
+    assert len(recorder.preloaded) == 3
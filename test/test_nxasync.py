@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+from nx.nxasync import AsyncNXFileSet
+from nx.nxfile import NXFileSet
+
+
+def test_nxasync_gather_images():
+    fileset = NXFileSet(os.path.join(os.path.dirname(__file__), 'map.nx'))
+    nodes = [fileset.resolve(f'Tile/grassySoil.img/bsc/{i}') for i in range(2)]
+    front = AsyncNXFileSet(fileset, concurrency=2)
+
+    # Reusable across event loops
+    for _ in range(2):
+        data = asyncio.run(front.gather_images(nodes))
+        assert [len(x) for x in data] == [n.width * n.height * 4 for n in nodes]
+
+    fileset.close()
+
+
+def test_nxasync_resolve():
+    fileset = NXFileSet(os.path.join(os.path.dirname(__file__), 'map.nx'))
+    front = AsyncNXFileSet(fileset)
+    node = asyncio.run(front.resolve('Tile/grassySoil.img/bsc/0'))
+    assert node.name == '0'
+    fileset.close()
@@ -0,0 +1,23 @@
+from nx.nxcache import LRUCache
+
+
+def test_nxcache_eviction():
+    cache = LRUCache(10, sizeof=len)
+    cache.put('a', b'12345')
+    cache.put('b', b'1234')
+    assert cache.get('a') == b'12345'
+    cache.put('c', b'123')
+    assert 'b' not in cache
+    assert 'a' in cache
+    assert cache.size == 8
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_nxcache_oversized():
+    cache = LRUCache(4, sizeof=len)
+    cache.put('a', b'12345')
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.stats()['misses'] == 1
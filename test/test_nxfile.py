@@ -1,4 +1,5 @@
 import os
+import shutil
 
 import pytest
 
@@ -17,3 +18,55 @@ def test_nxfile():
     for nx_file in nx_files:
         file = NXFile(os.path.join(path, nx_file))
         assert isinstance(file, NXFile)
+
+
+def test_nxfile_resolve_cache():
+    file = NXFile(os.path.join(os.path.dirname(__file__), 'map.nx'))
+    node = file.resolve('Tile/grassySoil.img/bsc/0')
+    assert file.resolve('Tile/grassySoil.img/bsc/0') is node
+    assert file.resolve('Tile/grassySoil.img/missing/0') is None
+    assert file.resolve('Tile/grassySoil.img/missing/0') is None
+    assert file.resolve_stats()['hits'] >= 2
+
+
+def test_nxfile_node_cache():
+    path = os.path.join(os.path.dirname(__file__), 'map.nx')
+    for policy in ['unbounded', 'lru', 'weak']:
+        file = NXFile(path, node_cache=policy, node_cache_size=4)
+        node = file.resolve('Tile/grassySoil.img/bsc/0')
+        assert file.get_node(node.index).name == '0'
+        usage = file.memory_usage()
+        assert usage['nodes'] > 0
+        assert usage['strings'] > 0
+
+
+def test_nxfile_outlink(tmp_path):
+    path = str(tmp_path / 'map.nx')
+    shutil.copy(os.path.join(os.path.dirname(__file__), 'map.nx'), path)
+
+    # Lazy resolve uses the target image and its size
+    file = NXFile(path)
+    target = file.resolve('Tile/grassySoil.img/bsc/0').get_image()
+    image = file.resolve('MapHelper.img/linked').get_image()
+    assert (image.offset, image.width, image.height) == \
+        (target.offset, target.width, target.height)
+    pixels = target.get_data()
+    file.close()
+    assert os.path.isfile(path + '.outlink')
+
+    # The persisted table gives the same image after a reload
+    file = NXFile(path)
+    image = file.resolve('MapHelper.img/linked').get_image()
+    assert (image.offset, image.width, image.height) == \
+        (target.offset, target.width, target.height)
+    assert image.get_data() == pixels
+    file.close()
+
+    # A full scan finds it too
+    os.remove(path + '.outlink')
+    file = NXFile(path)
+    file.outlinks.scan()
+    assert file.outlinks.scanned
+    link = file.outlinks.get(file.resolve('MapHelper.img/linked').image_index)
+    assert link == ('map.nx', target.offset, target.width, target.height)
+    file.close()
@@ -34,3 +34,30 @@ def test_nximage3():
     assert node.width == 131
     assert node.height == 39
     assert len(byte) == 131 * 39 * 4
+
+
+def test_nximage_decode_images():
+    file = NXFile(os.path.join(os.path.dirname(__file__),  'map.nx'), workers=4)
+    nodes = [file.resolve("Tile/grassySoil.img/bsc/0"),
+             file.resolve("Obj/acc1.img/grassySoil/nature/0/0")]
+    decoded = dict((node.index, data) for node, data in file.decode_images(nodes))
+    for node in nodes:
+        assert decoded[node.index] == node.get_image().get_data()
+
+
+class BrokenNode:
+    """ Image node whose pixels can not be decoded """
+
+    index = -1
+
+    def get_image(self):
+        raise ValueError('corrupt lz4 block')
+
+
+def test_nximage_decode_images_failure():
+    file = NXFile(os.path.join(os.path.dirname(__file__),  'map.nx'), workers=4)
+    good = file.resolve("Tile/grassySoil.img/bsc/0")
+    broken = BrokenNode()
+    decoded = dict(file.decode_images([broken, good]))
+    assert decoded[broken] is None
+    assert decoded[good] == good.get_image().get_data()
@@ -0,0 +1,45 @@
+import os
+import shutil
+
+from nx.nxfile import NXFile
+from nx.nxindex import NXIndex
+
+
+def test_nxindex_lookup(tmp_path):
+    path = str(tmp_path / 'map.nx')
+    shutil.copy(os.path.join(os.path.dirname(__file__), 'map.nx'), path)
+
+    # Build, then map it from a fresh file
+    file = NXFile(path, path_index=False)
+    NXIndex.build(file)
+    file.close()
+    file = NXFile(path)
+    assert file.index is not None
+
+    # Directory-level paths hit, others miss
+    node = file.resolve('Tile/grassySoil.img/bsc')
+    assert file.index.lookup('Tile/grassySoil.img/bsc') == node.index
+    assert file.index.lookup('Tile/grassySoil.img/missing') is None
+    file.close()
+
+    # A changed nx file makes the index stale
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert NXIndex.open(NXFile(path, path_index=False)) is None
+
+
+def test_nxindex_broken_sidecar(tmp_path):
+    path = str(tmp_path / 'map.nx')
+    shutil.copy(os.path.join(os.path.dirname(__file__), 'map.nx'), path)
+    file = NXFile(path, path_index=False)
+
+    # Empty and truncated sidecars are ignored, then rebuilt in place
+    for data in [b'', b'NXIX']:
+        with open(path + NXIndex.SUFFIX, 'wb') as sidecar:
+            sidecar.write(data)
+        assert NXIndex.open(file) is None
+        NXIndex.build(file)
+        index = NXIndex.open(file)
+        assert index is not None
+        index.close()
+    file.close()
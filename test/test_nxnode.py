@@ -17,3 +17,21 @@ def test_nxnode_resolve():
     node3 = NXFile(os.path.join(os.path.dirname(__file__),  'map.nx')).get_root_node().get_child('Tile').resolve(
         "grassySoil.img/bsc").get_child('0')
     assert node3.width == 90
+
+
+def test_nxnode_get_child():
+    node = NXFile(os.path.join(os.path.dirname(__file__),  'map.nx')).resolve(
+        "Tile/grassySoil.img")
+    for child in node.iter_children():
+        assert node.get_child(child.name).index == child.index
+    assert node.list_children() == [c.name for c in node.get_children()]
+    assert node.get_child('does_not_exist') is None
+
+
+def test_nxnode_walk():
+    file = NXFile(os.path.join(os.path.dirname(__file__),  'map.nx'))
+    paths = [path for path, node in file.walk('Tile/grassySoil.img', types=[5])]
+    assert 'Tile/grassySoil.img/bsc/0' in paths
+    for path, node in file.walk('Tile', max_depth=2):
+        assert path.count('/') <= 2
+        assert file.resolve(path).index == node.index
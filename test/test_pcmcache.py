@@ -0,0 +1,46 @@
+import os
+
+from maplepy.sound.pcmcache import PcmCache
+
+
+def age(cache, key, seconds):
+    """ Set a cached file's last use to seconds ago """
+    path = os.path.join(cache.path, key + PcmCache.SUFFIX)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1000000000))
+
+
+def test_pcmcache_get_put(tmp_path):
+    cache = PcmCache(str(tmp_path), 1000)
+    assert cache.get('a') is None
+    cache.put('a', b'1234')
+    assert cache.get('a') == b'1234'
+
+
+def test_pcmcache_evicts_least_recently_used(tmp_path):
+    cache = PcmCache(str(tmp_path), 250)
+    cache.put('a', bytes(100))
+    cache.put('b', bytes(100))
+    age(cache, 'a', 30)
+    age(cache, 'b', 20)
+
+    # Reading a marks it as recently used, so b goes first
+    assert cache.get('a')
+    cache.put('c', bytes(100))
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+
+    # Never above the cap
+    size = sum(entry.stat().st_size for entry in os.scandir(cache.path))
+    assert size <= 250
+
+
+def test_pcmcache_failed_put(tmp_path, monkeypatch):
+    cache = PcmCache(str(tmp_path), 1000)
+
+    def replace(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', replace)
+
+    cache.put('a', b'1234')
+    assert os.listdir(cache.path) == []
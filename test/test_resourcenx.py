@@ -0,0 +1,152 @@
+import os
+import threading
+
+import pygame
+
+import maplepy.nx.displayitemsnx as displayitemsnx
+import nx.nxfile as nxfile
+from maplepy.nx.mapnx import MapNx
+from maplepy.nx.resourcenx import Resource, ResourceNx
+from nx.nxfile import NXFile
+
+
+class CountingFile:
+    """ Counts resolves made through an nx file """
+
+    def __init__(self, nxfile):
+        self.nxfile = nxfile
+        self.resolves = 0
+
+    def resolve(self, path):
+        self.resolves += 1
+        return self.nxfile.resolve(path)
+
+
+def test_resourcenx_get_data_hit():
+    file = CountingFile(NXFile(os.path.join(os.path.dirname(__file__), 'map.nx')))
+    resources = ResourceNx()
+
+    # First request loads, the next ones hit the same entry
+    data = resources.get_data(file, 'Map', 'Map0/000010000', 'info', None)
+    assert data['bgm']
+    assert resources.get_data(file, 'Map', 'Map0/000010000', 'info', None) is data
+    assert resources.get_sprite(file, 'Map', 'Map0/000010000', 'info', None) is None
+    assert file.resolves == 1
+
+    stats = resources.get_stats()['Map']
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_resourcenx_missing_is_cached():
+    file = CountingFile(NXFile(os.path.join(os.path.dirname(__file__), 'map.nx')))
+    resources = ResourceNx()
+    assert resources.get_data(file, 'Tile', 'missing', 'bsc', '0') is None
+    assert resources.get_data(file, 'Tile', 'missing', 'bsc', '0') is None
+    assert file.resolves == 1
+
+
+def test_resourcenx_pin_release():
+    resources = ResourceNx()
+    a = [('Tile', 't', 'u', '0'), ('Tile', 't', 'u', '1')]
+    b = [('Tile', 't', 'u', '1'), ('Obj', 'o', 'l', '0')]
+    for key in a + b + [('Back', 'b', 'back', '0')]:
+        resources.store(ResourceNx.get_key(*key), Resource(data={}))
+
+    # Switching keeps the left map in the tail, unpinned resources go
+    resources.pin('a', a)
+    resources.pin('b', b)
+    resources.release('a', keep=1)
+    assert set(resources.resources) == {'Tile/t.img/u/0', 'Tile/t.img/u/1', 'Obj/o.img/l/0'}
+    assert resources.references['Tile/t.img/u/1'] == 2
+
+    # Falling out of the tail drops what only that map used
+    resources.pin('c', [])
+    resources.release('b', keep=1)
+    assert set(resources.resources) == {'Tile/t.img/u/1', 'Obj/o.img/l/0'}
+    assert resources.references == {'Tile/t.img/u/1': 1, 'Obj/o.img/l/0': 1}
+
+    # Coming back to a map in the tail keeps it pinned
+    resources.pin('b', b)
+    resources.release('c', keep=0)
+    assert resources.references == {'Tile/t.img/u/1': 1, 'Obj/o.img/l/0': 1}
+
+
+def test_resourcenx_release_while_storing():
+    resources = ResourceNx()
+    errors = []
+
+    # Enough pinned entries that a release takes a while
+    keys = [('Tile', 't', 'u', str(i)) for i in range(50000)]
+    for key in keys:
+        resources.store(ResourceNx.get_key(*key), Resource(data={}))
+    resources.pin('a', keys)
+
+    def store():
+        try:
+            for i in range(20000):
+                resources.store(f'Obj/o.img/l/{i}', Resource(data={}))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=store)
+    thread.start()
+    while thread.is_alive():
+        resources.release('b')
+    thread.join()
+    assert not errors
+
+
+def load_map(map_nx, map_id):
+    """ Build every sprite group of a map like DisplayNx does """
+    displayitemsnx.BackgroundSpritesNx().load_background(map_nx, map_id)
+    for i in range(0, 8):
+        displayitemsnx.LayeredSpritesNx().load_layer(map_nx, map_id, i)
+    displayitemsnx.LayeredSpritesNx().load_portal(map_nx, map_id)
+
+
+def open_map(monkeypatch):
+    """ Open test/map.nx with a fresh resource manager and a dummy display """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((8, 8))
+    resources = ResourceNx()
+    monkeypatch.setattr(displayitemsnx, 'resource_manager', resources)
+    map_nx = MapNx()
+    map_nx.open(os.path.join(os.path.dirname(__file__), 'map.nx'))
+    return map_nx, resources
+
+
+def test_resourcenx_preload_manifest(monkeypatch):
+    map_nx, resources = open_map(monkeypatch)
+    manifest = map_nx.get_manifest('000010000')
+    assert len(manifest) == len(set(manifest))
+
+    # Preloading the plan leaves the loaders nothing to load
+    resources.preload(map_nx.file, manifest)
+    resources.record()
+    load_map(map_nx, '000010000')
+    usage = resources.stop_recording()
+    assert set(usage) == set(manifest)
+    assert all(stats['misses'] == 0 for stats in resources.get_stats().values())
+    pygame.display.quit()
+
+
+def test_resourcenx_preload_failure(monkeypatch):
+    map_nx, resources = open_map(monkeypatch)
+    manifest = map_nx.get_manifest('000010000')
+    broken = ResourceNx.get_key(*manifest[0])
+
+    # One image fails to decode
+    def decode_image(node):
+        if node is map_nx.file.resolve(broken):
+            raise RuntimeError('corrupt lz4 block')
+        return node.get_image().get_data()
+    monkeypatch.setattr(nxfile, 'decode_image', decode_image)
+
+    # The rest is preloaded, the broken one loads later through the old path
+    resources.preload(map_nx.file, manifest)
+    assert broken not in resources.resources
+    assert len(resources.resources) == len(manifest) - 1
+    load_map(map_nx, '000010000')
+    assert broken in resources.resources
+    pygame.display.quit()
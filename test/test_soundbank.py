@@ -0,0 +1,48 @@
+import os
+
+import pygame
+import pytest
+
+from maplepy.sound.soundbank import SoundBank
+
+ATTACK = os.path.join(os.path.dirname(__file__), '..', 'sandbox', 'data', 'sounds', 'attack.wav')
+
+
+@pytest.fixture(autouse=True)
+def mixer():
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+    yield
+    pygame.mixer.quit()
+
+
+def test_soundbank_steals_oldest_channel():
+    bank = SoundBank(channels=2, min_interval=0)
+    bank.load('attack', ATTACK)
+
+    # Fill the pool, the third play reuses the first channel
+    first = bank.play('attack')
+    second = bank.play('attack')
+    assert first and second and first is not second
+    assert bank.play('attack') is first
+    assert bank.play('attack') is second
+
+
+def test_soundbank_rate_limit():
+    bank = SoundBank(channels=2, min_interval=10000)
+    assert bank.play('attack', file=ATTACK)
+    assert bank.play('attack') is None
+    assert bank.play('attack', min_interval=0)
+
+
+def test_soundbank_reload_evicted():
+    bank = SoundBank(channels=2, min_interval=0, cache_size=1)
+
+    # Nothing fits the cache, the effect is read from its file again
+    bank.load('attack', ATTACK)
+    assert len(bank.sounds) == 0
+    assert bank.play('attack')
+    assert bank.sounds.misses == 2
+
+    # Unknown effects without nx files are skipped
+    assert bank.play('missing') is None